@@ -1,44 +1,36 @@
 import re
+import time
 import logging
+from contextlib import nullcontext
+from dataclasses import replace
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import List, Optional, Dict
-
-import pandas as pd
-from pandas.tseries.offsets import DateOffset
+from typing import List, Optional, Dict, Tuple
 
 from . import config
 from .data_models import CalibrationStandard, InstrumentSheet, CertificateUsage, CompilationData, SheetError
-from .excel_io import parse_date_robust
+from .excel_io import parse_date_robust, is_na_value
+from .registry import RegistryIndex, data_naive
+from .matching import AhoCorasick
+from .profiling import ProfiloRegole, TIPO_CONTROLLO
+from .normalization import normalize_sp_code, normalize_um, normalize_range_string
 
 logger = logging.getLogger(__name__)
 
-def normalize_sp_code(sp_code_raw) -> str:
-    if pd.isna(sp_code_raw): return ""
-    s_norm = str(sp_code_raw).strip().upper().replace("S.P.","SP").replace(".","").replace("-","/")
-    s_norm = " ".join(s_norm.split())
-    return re.sub(r'\s*SP\s*(\d+)\s*/\s*(\d+)', r'SP \1/\2', s_norm)
-
-def normalize_um(um_str_raw) -> str:
-    if pd.isna(um_str_raw): return ""
-    s_norm = str(um_str_raw).strip().lower()
-    s_norm = " ".join(s_norm.split())
-    for k, v in config.MAPPA_NORMALIZZAZIONE_UM.items(): s_norm = s_norm.replace(k,v)
-    return s_norm.replace(" ","")
-
-def normalize_range_string(range_str_raw) -> str:
-    if pd.isna(range_str_raw): return ""
-    if isinstance(range_str_raw,(int,float)):
-        range_str_raw = str(int(range_str_raw)) if range_str_raw == int(range_str_raw) else str(range_str_raw)
-    norm_str = str(range_str_raw).lower()
-    norm_str = " ".join(norm_str.split())
-    norm_str = re.sub(r'\s*[\/÷]\s*','-',norm_str)
-    norm_str = re.sub(r'\s*to\s*','-',norm_str,flags=re.IGNORECASE)
-    norm_str = re.sub(r'\s*-\s*','-',norm_str)
-    return re.sub(r'\s+','',norm_str)
+# Range numerico "min sep max [UM]", es. "0-16 bar", "-1 ÷ 5", "0 to 1,5 kg/cm2".
+_RANGE_NUMERICO = re.compile(r'^([-+]?\d+(?:[.,]\d+)?)\s*(?:-|÷|/|to|\.\.)\s*([-+]?\d+(?:[.,]\d+)?)\s*(.*)$')
+
+def parse_range_numerico(range_str_raw) -> Optional[Tuple[float, float, str]]:
+    """(minimo, massimo, UM normalizzata) di un range testuale; None se non è un range numerico."""
+    if is_na_value(range_str_raw) or not isinstance(range_str_raw, str): return None
+    match = _RANGE_NUMERICO.match(" ".join(range_str_raw.strip().lower().split()))
+    if not match: return None
+    a, b = (float(x.replace(',', '.')) for x in match.group(1, 2))
+    return min(a, b), max(a, b), normalize_um(match.group(3).strip("()[] "))
 
 def is_cell_value_empty(cell_value) -> bool:
     if cell_value is None: return True
-    if pd.isna(cell_value): return True
+    if is_na_value(cell_value): return True
     if isinstance(cell_value, str) and not cell_value.strip(): return True
     if str(cell_value).strip().lower() == "nan": return True
     return False
@@ -48,16 +40,284 @@ def is_um_pressione_valida(um: str) -> bool:
 
 def trova_strumenti_alternativi(
     range_richiesto_raw: str,
-    data_riferimento_scheda: datetime,
-    strumenti_campione_list: List[CalibrationStandard]
+    data_riferimento_scheda: Optional[datetime],
+    registro: RegistryIndex
+) -> List[CalibrationStandard]:
+    """
+    Campioni validi alla data di riferimento (emissione <= data < scadenza); senza data si usa quella dell'analisi.
+    Se il range richiesto è numerico (es. "0-16 bar") vengono restituiti i campioni con la stessa UM il cui
+    range lo contiene, dal più aderente; altrimenti quelli con lo stesso range normalizzato, dalla scadenza più lontana.
+    """
+    if not registro:
+        logger.warning("Lista strumenti campione vuota o non disponibile in trova_strumenti_alternativi.")
+        return []
+    if not isinstance(registro, RegistryIndex):
+        registro = RegistryIndex(registro)
+    range_richiesto_norm = normalize_range_string(range_richiesto_raw)
+    if data_riferimento_scheda is None:
+        data_riferimento_naive = config.ANALYSIS_DATETIME.replace(tzinfo=None)
+    else:
+        data_riferimento_naive = data_naive(data_riferimento_scheda)
+    range_numerico = parse_range_numerico(range_richiesto_raw)
+    if range_numerico is not None:
+        alternative_valide = registro.copertura(*range_numerico, data_riferimento_naive)
+    else:
+        alternative_valide = registro.alternative(range_richiesto_norm, data_riferimento_naive)
+    logger.debug(f"Trovate {len(alternative_valide)} alternative valide con range '{range_richiesto_norm}'.")
+    return alternative_valide
+
+def alternative_in_cache(
+    range_richiesto_raw: str,
+    data_riferimento_scheda: Optional[datetime],
+    registro: RegistryIndex
 ) -> List[CalibrationStandard]:
-    # ... (implementation is correct)
-    return []
+    """trova_strumenti_alternativi con i risultati memorizzati nel registro per (range, data)."""
+    return registro.cache_alternative(str(range_richiesto_raw).strip(), data_riferimento_scheda)
+
+def utilizzo_da_sostituire(usage: CertificateUsage) -> bool:
+    """True se il certificato usato è non congruo, scaduto all'uso o usato prima dell'emissione."""
+    return usage.is_congruent is False or usage.is_expired_at_use or usage.used_before_emission
+
+def suggerisci_alternative(
+    usages: List[CertificateUsage],
+    registro: RegistryIndex,
+    top_n: int
+) -> Dict[int, List[CalibrationStandard]]:
+    """
+    Prime `top_n` alternative (escluso il certificato stesso) per ogni utilizzo da sostituire, per id(utilizzo):
+    lo stesso certificato può comparire in più slot di una scheda con range diversi. Gli utilizzi devono restare
+    referenziati finché si usa il risultato. Ogni coppia (range sulla scheda, data scheda) viene cercata una volta sola.
+    """
+    if not registro:
+        return {}
+    suggerimenti = {}
+    for usage in usages:
+        if not utilizzo_da_sostituire(usage): continue
+        alternative = alternative_in_cache(usage.instrument_range_on_card, usage.card_date, registro)
+        suggerimenti[id(usage)] = [sc for sc in alternative if sc.id_certificato != usage.certificate_id][:top_n]
+    logger.info(f"Alternative calcolate per {len(suggerimenti)} utilizzi segnalati ({registro.cache_alternative.cache_info().currsize} ricerche distinte in cache).")
+    return suggerimenti
+
+# Chiavi della mappa L9 nell'ordine di priorità della ricerca parziale (più lunghe prima) e automa che le trova tutte in una scansione.
+_CHIAVI_L9 = sorted(config.MAPPA_L9_SOTTOTIPO_NORMALIZZATA, key=len, reverse=True)
+_AUTOMA_L9 = AhoCorasick(_CHIAVI_L9)
+
+def _sottotipo_compatibile(tipologia_strumento_scheda: str, chiave_l9: str) -> Optional[str]:
+    poss_l9_val = config.MAPPA_L9_SOTTOTIPO_NORMALIZZATA[chiave_l9]
+    for cand_l9 in ([poss_l9_val] if isinstance(poss_l9_val, str) else poss_l9_val):
+        # Un sottotipo è valido se contiene la tipologia SP (es. SP=TEMPERATURA, sottotipo=TEMPERATURA_TERMOCOPPIA) o coincide con essa
+        if tipologia_strumento_scheda in cand_l9 or cand_l9 == tipologia_strumento_scheda:
+            return cand_l9
+    return None
+
+@lru_cache(maxsize=None)
+def determina_sottotipo_l9(tipologia_strumento_scheda: str, modello_l9_scheda: str) -> str:
+    """Sottotipo L9 compatibile con la tipologia SP: prima corrispondenza esatta, poi la chiave più lunga contenuta nel modello."""
+    if modello_l9_scheda in config.MAPPA_L9_SOTTOTIPO_NORMALIZZATA:
+        return _sottotipo_compatibile(tipologia_strumento_scheda, modello_l9_scheda) or "N/A"
+    if modello_l9_scheda:
+        for indice in _AUTOMA_L9.find_all(modello_l9_scheda):
+            sott_l9_eff = _sottotipo_compatibile(tipologia_strumento_scheda, _CHIAVI_L9[indice])
+            if sott_l9_eff: return sott_l9_eff
+    return "N/A"
+
+# LIVELLO con MANOMETRO DIGITALE: l'esito dipende da tipo scheda, L9 e UM di uscita (vedi _congruita_livello_man_dig).
+_CASO_LIVELLO_MAN_DIG = ("LIVELLO", "MANOMETRO DIGITALE")
+
+def _regola_congruita(reg_tip: dict, tipologia: str, sott_l9_eff: str, mod_camp_reg: str) -> Tuple[bool, Optional[str]]:
+    """Esito delle regole di congruità per una combinazione; nota None = incongruo di default (nota costruita con L9 e sottotipo)."""
+    eccezioni = reg_tip.get("eccezioni_l9_incongrui", {})
+    sottotipi = reg_tip.get("sottotipi_l9", {})
+    if sott_l9_eff != "N/A" and mod_camp_reg in eccezioni.get(sott_l9_eff, []):
+        return False, f"INCONGRUO (eccL9):'{mod_camp_reg}' per {tipologia}({sott_l9_eff})."
+    if mod_camp_reg in reg_tip.get("modelli_campione_incongrui", []):
+        # Incongruo in generale, ma il sottotipo L9 può renderlo congruo
+        if sott_l9_eff != "N/A" and mod_camp_reg in sottotipi.get(sott_l9_eff, []):
+            return True, f"OK (sottL9 sovrascrive incongruo gen.):'{mod_camp_reg}' per {tipologia}({sott_l9_eff})."
+        return False, f"INCONGRUO (lista gen):'{mod_camp_reg}' per {tipologia}."
+    if sott_l9_eff != "N/A" and mod_camp_reg in sottotipi.get(sott_l9_eff, []):
+        return True, f"OK (sottL9):'{mod_camp_reg}' per {tipologia}({sott_l9_eff})."
+    if mod_camp_reg in reg_tip.get("modelli_campione_congrui", []):
+        return True, "OK (regole base)."
+    return False, None
+
+def compila_tabella_congruita(regole: Dict[str, dict]) -> Dict[Tuple[str, str, str], Tuple[bool, Optional[str]]]:
+    """
+    Tabella (tipologia, sottotipo L9, modello campione) -> (congruo, nota) per tutti i modelli e sottotipi
+    citati nelle regole. Un sottotipo assente equivale a "N/A", un modello assente è incongruo di default.
+    Il caso LIVELLO con MANOMETRO DIGITALE dipende da tipo scheda, L9 e UM e resta fuori dalla tabella.
+    """
+    tabella = {}
+    for tipologia, reg_tip in regole.items():
+        sottotipi = reg_tip.get("sottotipi_l9", {})
+        eccezioni = reg_tip.get("eccezioni_l9_incongrui", {})
+        modelli = set(reg_tip.get("modelli_campione_congrui", [])) | set(reg_tip.get("modelli_campione_incongrui", []))
+        for elenco in (*sottotipi.values(), *eccezioni.values()): modelli.update(elenco)
+        for sott_l9_eff in dict.fromkeys(["N/A", *sottotipi, *eccezioni]):
+            for mod_camp_reg in sorted(modelli):
+                if (tipologia, mod_camp_reg) == _CASO_LIVELLO_MAN_DIG: continue
+                tabella[(tipologia, sott_l9_eff, mod_camp_reg)] = _regola_congruita(reg_tip, tipologia, sott_l9_eff, mod_camp_reg)
+    return tabella
+
+_TABELLA_CONGRUITA = compila_tabella_congruita(config.REGOLE_CONGRUITA_CERTIFICATI_NORMALIZZATE)
+
+def dump_tabella_congruita(output_path: str) -> int:
+    """Scrive la tabella di congruità compilata in CSV (separatore ';') per verifica; restituisce il numero di righe."""
+    import csv
+    with open(output_path, "w", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out, delimiter=";")
+        writer.writerow(["tipologia", "sottotipo_l9", "modello_campione", "congruo", "note"])
+        for (tipologia, sott_l9_eff, mod_camp_reg), (is_congr, note) in sorted(_TABELLA_CONGRUITA.items()):
+            writer.writerow([tipologia, sott_l9_eff, mod_camp_reg, is_congr, note or "INCONGRUO (default)"])
+        writer.writerow([_CASO_LIVELLO_MAN_DIG[0], "*", _CASO_LIVELLO_MAN_DIG[1], "", "Caso speciale: dipende da tipo scheda, L9 e UM di uscita."])
+    return len(_TABELLA_CONGRUITA)
+
+def _congruita_livello_man_dig(file_type: str, modello_l9_scheda: str, um_usc_norm: str) -> Optional[Tuple[bool, str]]:
+    """Caso speciale LIVELLO con MANOMETRO DIGITALE; None se il tipo scheda non è né digitale né analogico."""
+    if file_type == 'digitale':
+        return True, "OK (LIV digitale con MAN DIG)."
+    if file_type != 'analogico':
+        return None
+    cell_um_usc = config.SCHEDA_ANA_CELL_UM_USCITA
+    um_psi, um_ma = config.UM_PSI_NORMALIZZATA, config.UM_MA_NORMALIZZATA
+    if modello_l9_scheda == "DP":
+        return True, "OK (LIV DP analogico con MAN DIG)."
+    if ("TORSIONALE PNEUMATICO" in modello_l9_scheda and um_usc_norm == um_psi) or \
+       ("TORSIONALE LOCALE" in modello_l9_scheda and um_usc_norm == um_psi) or \
+       ("CAPILLARE" in modello_l9_scheda and um_usc_norm == um_ma):
+        return True, f"OK (LIV {modello_l9_scheda} con MAN DIG e UM Uscita ({cell_um_usc})='{um_usc_norm.upper()}')."
+    error_details = []
+    um_trovata = um_usc_norm.upper() if um_usc_norm else 'VUOTO'
+    for chiave_l9, um_attesa in (("TORSIONALE PNEUMATICO", um_psi), ("TORSIONALE LOCALE", um_psi), ("CAPILLARE", um_ma)):
+        if chiave_l9 in modello_l9_scheda and um_usc_norm != um_attesa:
+            error_details.append(f"per L9 '{modello_l9_scheda}' UM Uscita ({cell_um_usc}) deve essere '{um_attesa.upper()}' (trovato: '{um_trovata}')")
+    allowed_l9_for_man_dig_str = "'DP', 'TORSIONALE PNEUMATICO' (con F12='PSI'), 'TORSIONALE LOCALE' (con F12='PSI'), 'CAPILLARE' (con F12='mA')"
+    reason_str = "; ".join(error_details) if error_details else f"L9='{modello_l9_scheda}' non supportato con MAN DIG. Ammessi: {allowed_l9_for_man_dig_str}"
+    return False, f"INCONGRUO: MAN DIG per LIV analogico. {reason_str}."
+
+def valuta_congruita_campione(
+    tipologia_strumento_scheda: str, file_type: str, modello_l9_scheda: str, sott_l9_eff: str, mod_camp_reg: str, um_usc_norm: str
+) -> Tuple[Optional[bool], str]:
+    """Verifica se il modello campione del registro è adatto alla tipologia (e al sottotipo L9) della scheda."""
+    if (tipologia_strumento_scheda, mod_camp_reg) == _CASO_LIVELLO_MAN_DIG:
+        esito = _congruita_livello_man_dig(file_type, modello_l9_scheda, um_usc_norm)
+    else:
+        esito = _TABELLA_CONGRUITA.get((tipologia_strumento_scheda, sott_l9_eff, mod_camp_reg)) \
+            or _TABELLA_CONGRUITA.get((tipologia_strumento_scheda, "N/A", mod_camp_reg))
+    is_congr, congr_notes = esito if esito is not None else (False, None)
+    if congr_notes is None:
+        congr_notes = f"INCONGRUO (default): '{mod_camp_reg}' per {tipologia_strumento_scheda} (L9:'{modello_l9_scheda}',SottL9Eff:'{sott_l9_eff}')."
+
+    # L9 = "TERMOCOPPIA" senza tipo K/J con MULTIMETRO: resta anomalia L9, ma con nota esplicativa
+    if not is_congr and tipologia_strumento_scheda == "TEMPERATURA" and mod_camp_reg == "MULTIMETRO DIGITALE" \
+            and modello_l9_scheda == "TERMOCOPPIA" and sott_l9_eff == "N/A":
+        reg_tip = config.REGOLE_CONGRUITA_CERTIFICATI_NORMALIZZATE[tipologia_strumento_scheda]
+        if mod_camp_reg in reg_tip.get("sottotipi_l9", {}).get("TEMPERATURA_TERMOCOPPIA", []):
+            congr_notes = "Dettaglio: L9='TERMOCOPPIA' incompleto (manca tipo K/J), MULTIMETRO sarebbe OK per Termocoppia completa."
+    return is_congr, congr_notes
+
+def verifica_certificati_usati(
+    raw_data: Dict,
+    file_type: str,
+    card_date: Optional[datetime],
+    tipologia_strumento_scheda: str,
+    modello_l9_scheda: str,
+    registro: RegistryIndex
+) -> List[CertificateUsage]:
+    """Estrae i certificati dei tre slot della scheda e ne verifica scadenza, emissione e congruità con il registro."""
+    file_path = raw_data['file_path']
+    base_filename = raw_data['base_filename']
+    um_usc_norm = normalize_um(raw_data.get('um_usc'))
+    sott_l9_eff = "N/A"
+    if file_type == 'analogico' and modello_l9_scheda not in ("N/A", "", "SKIN POINT"):
+        sott_l9_eff = determina_sottotipo_l9(tipologia_strumento_scheda, modello_l9_scheda)
+
+    usages: List[CertificateUsage] = []
+    slots = zip(raw_data.get('cert_ids', []), raw_data.get('cert_expiries', []), raw_data.get('cert_models', []), raw_data.get('cert_ranges', []))
+    for i, (cert_id_raw, exp_raw, mod_raw_card, ran_raw_card) in enumerate(slots):
+        if is_cell_value_empty(cert_id_raw): continue
+        cert_id = str(cert_id_raw).strip()
+        cert_exp_dt = parse_date_robust(exp_raw, base_filename)
+        is_exp = bool(cert_exp_dt and card_date and cert_exp_dt < card_date)
+
+        is_congr, congr_notes, mod_camp_reg, used_before_em = None, "Verifica non iniziata.", "N/D_NonTrovatoRegistro", False
+        if not registro:
+            congr_notes = "Registro campioni non disponibile."
+        else:
+            found_camp = registro.trova(cert_id)
+            if not found_camp:
+                congr_notes = f"Cert.ID '{cert_id}' NON TROVATO nel registro."
+            else:
+                mod_camp_reg = (found_camp.modello_strumento or "N/D_ModMancanteRegistro").strip().upper()
+                dt_em_camp = found_camp.data_emissione
+                if dt_em_camp and card_date and card_date < dt_em_camp:
+                    used_before_em, is_congr = True, False
+                    congr_notes = f"Dettaglio: errato per EMISSIONE. Cert.'{cert_id}'({mod_camp_reg}) usato il {card_date:%d/%m/%Y} ma il certificato è stato emesso il {dt_em_camp:%d/%m/%Y}."
+                elif mod_camp_reg.startswith("N/D_"):
+                    congr_notes = f"Cert.ID '{cert_id}' trovato, ma modello campione N/D nel registro."
+                elif tipologia_strumento_scheda == "N/D":
+                    congr_notes = f"Tipologia strumento scheda ('{tipologia_strumento_scheda}') non valida o non mappata."
+                elif tipologia_strumento_scheda not in config.REGOLE_CONGRUITA_CERTIFICATI_NORMALIZZATE:
+                    congr_notes = f"Regole congruità non definite per tipologia '{tipologia_strumento_scheda}'."
+                else:
+                    is_congr, congr_notes = valuta_congruita_campione(
+                        tipologia_strumento_scheda, file_type, modello_l9_scheda, sott_l9_eff, mod_camp_reg, um_usc_norm)
+
+        log_lvl = logging.DEBUG if is_congr is None else logging.ERROR if used_before_em else logging.WARNING if is_congr is False else logging.INFO
+        logger.log(log_lvl, f"{base_filename}(Slot {i+1}): Cert.ID '{cert_id}', Mod.Camp(Reg):'{mod_camp_reg}'. Scad:'{exp_raw}'. Congr:{is_congr}. Note: {congr_notes}")
+        usages.append(CertificateUsage(
+            file_name=base_filename, file_path=file_path, card_type=file_type, card_date=card_date,
+            certificate_id=cert_id, certificate_expiry_raw=str(exp_raw) if exp_raw is not None else "N/D", certificate_expiry=cert_exp_dt,
+            instrument_model_on_card=str(mod_raw_card).strip() if not is_cell_value_empty(mod_raw_card) else "N/D",
+            instrument_range_on_card=str(ran_raw_card).strip() if not is_cell_value_empty(ran_raw_card) else "N/D",
+            is_expired_at_use=is_exp, tipologia_strumento_scheda=tipologia_strumento_scheda,
+            modello_L9_scheda=modello_l9_scheda if file_type == 'analogico' else "N/A",
+            modello_strumento_campione_usato=mod_camp_reg, is_congruent=is_congr, congruency_notes=congr_notes,
+            used_before_emission=used_before_em,
+        ))
+    return usages
+
+def utilizzi_conteggiati(sheets) -> List[CertificateUsage]:
+    """Utilizzi delle schede valide: quelli contati nel cruscotto della GUI e nel riepilogo temporale del batch."""
+    return [usage for sheet in sheets if sheet is not None and sheet.is_valid for usage in sheet.certificate_usages]
+
+def riepilogo_temporale(usages: List[CertificateUsage]) -> Tuple[int, int]:
+    """
+    Riepilogo di fine analisi: (utilizzi scaduti all'uso, utilizzi prima dell'emissione), contati sugli
+    esiti della verifica per slot di verifica_certificati_usati.
+    """
+    n_scaduti = sum(1 for u in usages if u.is_expired_at_use)
+    n_prima_emissione = sum(1 for u in usages if u.used_before_emission)
+    logger.info(f"Verifica temporale su {len(usages)} utilizzi: {n_scaduti} scaduti all'uso, {n_prima_emissione} prima dell'emissione.")
+    return n_scaduti, n_prima_emissione
+
+def valida_regole(raw_data: Dict, tipologia_strumento_scheda: str, modello_l9_scheda: str, profilo: Optional[ProfiloRegole] = None) -> List[SheetError]:
+    """Applica le regole di validazione dinamiche (foglio RegoleValidazione) e restituisce gli errori trovati."""
+    rule_errors: List[SheetError] = []
+    if not config.VALIDATION_RULES:
+        return rule_errors
+
+    for key in config.motore_regole().valuta(raw_data, tipologia_strumento_scheda, modello_l9_scheda, profilo):
+        rule_errors.append(SheetError(key=key, description=config.human_error_messages_map_descriptive.get(key, "Errore non definito"), from_rule=True))
+    return rule_errors
+
+def merge_errori(errori_scheda: List[SheetError], errori_regole: List[SheetError]) -> List[SheetError]:
+    """Errori della scheda seguiti da quelli delle regole non già presenti (stessa chiave e cella)."""
+    presenti = {(e.key, e.cell) for e in errori_scheda}
+    return errori_scheda + [e for e in errori_regole if (e.key, e.cell) not in presenti]
+
+def _status_scheda(file_type: Optional[str], certificate_usages: List[CertificateUsage]) -> str:
+    return f"{file_type} - {len(certificate_usages)} cert." if file_type else "Tipo scheda non riconosciuto"
+
+def _senza_misura(nome: str, errori: list):
+    return nullcontext()
 
 def analyze_sheet_data(
     raw_data: Dict,
-    strumenti_campione_list: List[CalibrationStandard]
+    registro: RegistryIndex,
+    profilo: Optional[ProfiloRegole] = None
 ) -> InstrumentSheet:
+    """Analisi completa di una scheda. Con `profilo` vengono misurati ogni controllo fisso e ogni regola."""
     file_path = raw_data['file_path']
     base_filename = raw_data['base_filename']
     file_type = raw_data.get('file_type')
@@ -67,6 +327,8 @@ def analyze_sheet_data(
         if not any(e.key == key and e.cell == cell for e in human_errors):
             human_errors.append(SheetError(key=key, description=config.human_error_messages_map_descriptive.get(key, "Errore non definito"), cell=cell, suggestion=suggestion))
 
+    misura = profilo.misura if profilo is not None else _senza_misura
+
     card_date = parse_date_robust(raw_data.get('card_date'), base_filename)
 
     if not file_type:
@@ -96,21 +358,23 @@ def analyze_sheet_data(
     }
 
     tipi_da_controllare = ['analogico', 'digitale'] if not file_type else [file_type]
-    for tipo in tipi_da_controllare:
-        for field, (key, cell) in fields_to_validate[tipo].items():
-            raw_value = raw_data.get(field.lower())
-            if raw_value == "#FORMULA_ERROR#":
-                add_error(config.KEY_FORMULA_ERROR, cell)
-            elif is_cell_value_empty(raw_value):
-                add_error(key, cell)
-
-    contratto_val = raw_data.get('contratto')
-    if not is_cell_value_empty(contratto_val):
-        contratto_str = str(contratto_val).strip()
-        if not (contratto_str == config.VALORE_ATTESO_CONTRATTO_COEMI or contratto_str == config.VALORE_ATTESO_CONTRATTO_COEMI_VARIANTE_NUMERICA):
-            key_diverso = config.KEY_COMP_ANA_CONTRATTO_DIVERSO if file_type == 'analogico' else config.KEY_COMP_DIG_CONTRATTO_DIVERSO
-            cell_contratto = config.SCHEDA_ANA_CELL_CONTRATTO_COEMI if file_type == 'analogico' else config.SCHEDA_DIG_CELL_CONTRATTO_COEMI
-            add_error(key_diverso, cell_contratto, suggestion=config.VALORE_ATTESO_CONTRATTO_COEMI)
+    with misura("campi obbligatori", human_errors):
+        for tipo in tipi_da_controllare:
+            for field, (key, cell) in fields_to_validate[tipo].items():
+                raw_value = raw_data.get(field.lower())
+                if raw_value == "#FORMULA_ERROR#":
+                    add_error(config.KEY_FORMULA_ERROR, cell)
+                elif is_cell_value_empty(raw_value):
+                    add_error(key, cell)
+
+    with misura("contratto", human_errors):
+        contratto_val = raw_data.get('contratto')
+        if not is_cell_value_empty(contratto_val):
+            contratto_str = str(contratto_val).strip()
+            if not (contratto_str == config.VALORE_ATTESO_CONTRATTO_COEMI or contratto_str == config.VALORE_ATTESO_CONTRATTO_COEMI_VARIANTE_NUMERICA):
+                key_diverso = config.KEY_COMP_ANA_CONTRATTO_DIVERSO if file_type == 'analogico' else config.KEY_COMP_DIG_CONTRATTO_DIVERSO
+                cell_contratto = config.SCHEDA_ANA_CELL_CONTRATTO_COEMI if file_type == 'analogico' else config.SCHEDA_DIG_CELL_CONTRATTO_COEMI
+                add_error(key_diverso, cell_contratto, suggestion=config.VALORE_ATTESO_CONTRATTO_COEMI)
 
     if file_type:
         sp_code_raw_val = raw_data.get('sp_code')
@@ -126,76 +390,80 @@ def analyze_sheet_data(
             else:
                 modello_l9_scheda_normalizzato = ""
 
-    # Applica le regole di validazione dinamiche
-    if config.VALIDATION_RULES:
-        normalized_values = {
-            'um_ing': normalize_um(raw_data.get('um_ing')), 'um_usc': normalize_um(raw_data.get('um_usc')), 'um_dcs': normalize_um(raw_data.get('um_dcs')),
-            'range_ing': normalize_range_string(raw_data.get('range_ing')), 'range_usc': normalize_range_string(raw_data.get('range_usc')), 'range_dcs': normalize_range_string(raw_data.get('range_dcs')),
-            'modello_l9': modello_l9_scheda_normalizzato, 'range_um_processo': raw_data.get('range_um_processo', "")
-        }
-        for rule in config.VALIDATION_RULES:
-            if (rule['TipologiaStrumento'] != '*' and rule['TipologiaStrumento'] != tipologia_strumento_scheda): continue
-            if (rule['ModelloL9'] != '*' and rule['ModelloL9'] != modello_l9_scheda_normalizzato): continue
-            valore_a = raw_data.get(rule['CampoA'].lower()) if rule['CampoA'] not in normalized_values else normalized_values.get(rule['CampoA'])
-            valore_b_raw = rule['CampoB_o_Costante']
-            valore_b = raw_data.get(valore_b_raw) if valore_b_raw in raw_data else (normalized_values.get(valore_b_raw) if valore_b_raw in normalized_values else valore_b_raw)
-            triggered = False
-            op = rule['Operatore']
-            if op == 'is_empty':
-                if is_cell_value_empty(valore_a): triggered = True
-            elif op == 'is_not_empty':
-                if not is_cell_value_empty(valore_a): triggered = True
-            elif op == '==' and not is_cell_value_empty(valore_a):
-                if str(valore_a) == str(valore_b): triggered = True
-            elif op == '!=' and not is_cell_value_empty(valore_a):
-                if str(valore_a) != str(valore_b): triggered = True
-            elif op == 'in' and not is_cell_value_empty(valore_a):
-                lista_valori = [v.strip() for v in valore_b.split(',')]
-                if str(valore_a) in lista_valori: triggered = True
-            elif op == 'not_in' and not is_cell_value_empty(valore_a):
-                lista_valori = [v.strip() for v in valore_b.split(',')]
-                if str(valore_a) not in lista_valori: triggered = True
-            if triggered: add_error(rule['ChiaveErrore'])
-
     # Applica la logica di validazione hardcoded
     if file_type and tipologia_strumento_scheda != "N/D":
         if file_type == "analogico":
-            if modello_l9_scheda_normalizzato == "SKIN POINT": add_error(config.KEY_L9_SKINPOINT_INCOMPLETO, cell=config.SCHEDA_ANA_CELL_MODELLO_STRUM)
-            range_ing_norm = normalize_range_string(raw_data.get('range_ing'))
-            um_ing_norm = normalize_um(raw_data.get('um_ing'))
-            range_usc_norm = normalize_range_string(raw_data.get('range_usc'))
-            um_usc_norm = normalize_um(raw_data.get('um_usc'))
-            range_dcs_norm = normalize_range_string(raw_data.get('range_dcs'))
-            um_dcs_norm = normalize_um(raw_data.get('um_dcs'))
-            if tipologia_strumento_scheda == "TEMPERATURA":
-                if modello_l9_scheda_normalizzato == "CONVERTITORE":
-                    if not any(e.cell == config.SCHEDA_ANA_CELL_UM_INGRESSO or e.cell == config.SCHEDA_ANA_CELL_UM_DCS for e in human_errors) and um_ing_norm != um_dcs_norm: add_error(config.KEY_ERR_ANA_TEMP_CONV_C9F9_UM_DIVERSE)
-                    if not any(e.cell == config.SCHEDA_ANA_CELL_UM_USCITA for e in human_errors) and um_usc_norm != config.UM_MA_NORMALIZZATA: add_error(config.KEY_ERR_ANA_TEMP_CONV_F12_UM_NON_MA)
-                    if not any(e.cell == config.SCHEDA_ANA_CELL_RANGE_INGRESSO or e.cell == config.SCHEDA_ANA_CELL_RANGE_DCS for e in human_errors) and range_ing_norm != range_dcs_norm: add_error(config.KEY_ERR_ANA_TEMP_CONV_A9D9_RANGE_DIVERSI)
-                    if not any(e.cell == config.SCHEDA_ANA_CELL_RANGE_USCITA for e in human_errors) and range_usc_norm != config.RANGE_4_20_NORMALIZZATO: add_error(config.KEY_ERR_ANA_TEMP_CONV_D12_RANGE_NON_4_20)
-                elif not modello_l9_scheda_normalizzato == "":
-                    if not (um_ing_norm == um_dcs_norm and um_dcs_norm == um_usc_norm): add_error(config.KEY_ERR_ANA_TEMP_NOCONV_UM_NON_COINCIDENTI)
-                    if not (range_ing_norm == range_dcs_norm and range_dcs_norm == range_usc_norm): add_error(config.KEY_ERR_ANA_TEMP_NOCONV_RANGE_NON_COINCIDENTI)
+            with misura("L9 skin point", human_errors):
+                if modello_l9_scheda_normalizzato == "SKIN POINT": add_error(config.KEY_L9_SKINPOINT_INCOMPLETO, cell=config.SCHEDA_ANA_CELL_MODELLO_STRUM)
+            with misura("range/UM analogico", human_errors):
+                range_ing_norm = normalize_range_string(raw_data.get('range_ing'))
+                um_ing_norm = normalize_um(raw_data.get('um_ing'))
+                range_usc_norm = normalize_range_string(raw_data.get('range_usc'))
+                um_usc_norm = normalize_um(raw_data.get('um_usc'))
+                range_dcs_norm = normalize_range_string(raw_data.get('range_dcs'))
+                um_dcs_norm = normalize_um(raw_data.get('um_dcs'))
+                if tipologia_strumento_scheda == "TEMPERATURA":
+                    if modello_l9_scheda_normalizzato == "CONVERTITORE":
+                        if not any(e.cell == config.SCHEDA_ANA_CELL_UM_INGRESSO or e.cell == config.SCHEDA_ANA_CELL_UM_DCS for e in human_errors) and um_ing_norm != um_dcs_norm: add_error(config.KEY_ERR_ANA_TEMP_CONV_C9F9_UM_DIVERSE)
+                        if not any(e.cell == config.SCHEDA_ANA_CELL_UM_USCITA for e in human_errors) and um_usc_norm != config.UM_MA_NORMALIZZATA: add_error(config.KEY_ERR_ANA_TEMP_CONV_F12_UM_NON_MA)
+                        if not any(e.cell == config.SCHEDA_ANA_CELL_RANGE_INGRESSO or e.cell == config.SCHEDA_ANA_CELL_RANGE_DCS for e in human_errors) and range_ing_norm != range_dcs_norm: add_error(config.KEY_ERR_ANA_TEMP_CONV_A9D9_RANGE_DIVERSI)
+                        if not any(e.cell == config.SCHEDA_ANA_CELL_RANGE_USCITA for e in human_errors) and range_usc_norm != config.RANGE_4_20_NORMALIZZATO: add_error(config.KEY_ERR_ANA_TEMP_CONV_D12_RANGE_NON_4_20)
+                    elif not modello_l9_scheda_normalizzato == "":
+                        if not (um_ing_norm == um_dcs_norm and um_dcs_norm == um_usc_norm): add_error(config.KEY_ERR_ANA_TEMP_NOCONV_UM_NON_COINCIDENTI)
+                        if not (range_ing_norm == range_dcs_norm and range_dcs_norm == range_usc_norm): add_error(config.KEY_ERR_ANA_TEMP_NOCONV_RANGE_NON_COINCIDENTI)
         elif file_type == "digitale":
-            range_um_proc_raw = raw_data.get('range_um_processo', "")
-            if not is_cell_value_empty(range_um_proc_raw):
-                um_proc_norm = normalize_um(range_um_proc_raw)
-                full_string_as_um_norm = normalize_um(range_um_proc_raw)
-                if tipologia_strumento_scheda == "PRESSIONE":
-                    if not (is_um_pressione_valida(um_proc_norm) or is_um_pressione_valida(full_string_as_um_norm)):
-                        add_error(config.KEY_ERR_DIG_PRESS_D22_UM_NON_PRESSIONE, config.SCHEDA_DIG_CELL_RANGE_UM_PROCESSO)
-                elif tipologia_strumento_scheda == "LIVELLO":
-                    if config.UM_PERCENTO_NORMALIZZATA not in um_proc_norm:
-                        add_error(config.KEY_ERR_DIG_LIVELLO_D22_UM_NON_PERCENTO, config.SCHEDA_DIG_CELL_RANGE_UM_PROCESSO)
-
-    # Validazione Certificati (omitted for brevity)
+            with misura("UM processo digitale", human_errors):
+                range_um_proc_raw = raw_data.get('range_um_processo', "")
+                if not is_cell_value_empty(range_um_proc_raw):
+                    um_proc_norm = normalize_um(range_um_proc_raw)
+                    if tipologia_strumento_scheda == "PRESSIONE":
+                        if not is_um_pressione_valida(um_proc_norm):
+                            add_error(config.KEY_ERR_DIG_PRESS_D22_UM_NON_PRESSIONE, config.SCHEDA_DIG_CELL_RANGE_UM_PROCESSO)
+                    elif tipologia_strumento_scheda == "LIVELLO":
+                        if config.UM_PERCENTO_NORMALIZZATA not in um_proc_norm:
+                            add_error(config.KEY_ERR_DIG_LIVELLO_D22_UM_NON_PERCENTO, config.SCHEDA_DIG_CELL_RANGE_UM_PROCESSO)
+
+    # Applica le regole di validazione dinamiche
+    human_errors = merge_errori(human_errors, valida_regole(raw_data, tipologia_strumento_scheda, modello_l9_scheda_normalizzato, profilo))
+
+    # Validazione Certificati
     extracted_certs_data = []
+    if file_type:
+        inizio = time.perf_counter()
+        extracted_certs_data = verifica_certificati_usati(
+            raw_data, file_type, card_date, tipologia_strumento_scheda, modello_l9_scheda_normalizzato, registro)
+        if profilo is not None:
+            anomalie = any(u.is_expired_at_use or u.used_before_emission or u.is_congruent is False for u in extracted_certs_data)
+            profilo.registra(TIPO_CONTROLLO, "verifica certificati", anomalie, time.perf_counter() - inizio)
 
-    status_msg = f"{file_type} - {len(extracted_certs_data)} cert." if file_type else "Tipo scheda non riconosciuto"
+    status_msg = _status_scheda(file_type, extracted_certs_data)
     is_valid_sheet = not human_errors
     return InstrumentSheet(
         file_path=file_path, base_filename=base_filename, status=status_msg, is_valid=is_valid_sheet, card_date=card_date, file_type=file_type,
         tipologia_strumento=tipologia_strumento_scheda, modello_l9=modello_l9_scheda_normalizzato,
         certificate_usages=extracted_certs_data, human_errors=human_errors,
         compilation_data=CompilationData(file_path=file_path, base_filename=base_filename, file_type=file_type, pdl_val=str(raw_data.get('pdl')).strip() if not is_cell_value_empty(raw_data.get('pdl')) else None, odc_val_scheda=str(raw_data.get('odc')).strip() if not is_cell_value_empty(raw_data.get('odc')) else None)
-    )
\ No newline at end of file
+    )
+
+def riesegui_verifiche(
+    sheet: InstrumentSheet,
+    raw_data: Dict,
+    registro: RegistryIndex,
+    regole: bool = False,
+    certificati: bool = False,
+    profilo: Optional[ProfiloRegole] = None
+) -> InstrumentSheet:
+    """
+    Ripete solo alcuni stadi dell'analisi su una scheda già analizzata: le regole dinamiche
+    (se è cambiato RegoleValidazione) e/o la verifica dei certificati (se è cambiato il registro).
+    Il resto del risultato precedente viene mantenuto.
+    """
+    human_errors = sheet.human_errors
+    if regole:
+        human_errors = merge_errori([e for e in human_errors if not e.from_rule], valida_regole(raw_data, sheet.tipologia_strumento, sheet.modello_l9, profilo))
+    certificate_usages = sheet.certificate_usages
+    if certificati and sheet.file_type:
+        certificate_usages = verifica_certificati_usati(
+            raw_data, sheet.file_type, sheet.card_date, sheet.tipologia_strumento, sheet.modello_l9, registro)
+    return replace(sheet, status=_status_scheda(sheet.file_type, certificate_usages), is_valid=not human_errors,
+                   certificate_usages=certificate_usages, human_errors=human_errors)
@@ -0,0 +1,180 @@
+# analyzer_app/batch.py
+"""Analisi senza interfaccia grafica: legge configurazione e registro, analizza la cartella e scrive i risultati su file."""
+import os
+import csv
+import json
+import logging
+from dataclasses import asdict
+from datetime import date, datetime
+from typing import Optional
+
+from . import config, engine, analysis
+from .cache import open_raw_data_cache, load_registry
+from .data_models import InstrumentSheet
+from .profiling import ProfiloRegole, riporta_profilo
+from .registry import RegistryIndex
+
+logger = logging.getLogger(__name__)
+
+# Codici di uscita del processo.
+EXIT_OK = 0
+EXIT_ANOMALIE = 1
+EXIT_ERRORE = 2
+
+FORMATI_OUTPUT = ("jsonl", "csv")
+CSV_COLONNE = [
+    "file_path", "file", "tipo_scheda", "tipologia_strumento", "modello_l9", "data_scheda", "stato", "valida",
+    "errori_compilazione", "certificati", "usi_scaduti", "usi_prima_emissione", "usi_incongrui", "anomalie",
+]
+# Ogni quanti file scrivere l'avanzamento nel log.
+INTERVALLO_LOG_AVANZAMENTO = 100
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, set):
+        return sorted(value)
+    return str(value)
+
+
+def conta_anomalie(sheet: InstrumentSheet) -> int:
+    """Errori di compilazione più utilizzi di certificati scaduti, prima dell'emissione o incongrui; 1 se la scheda non è stata letta."""
+    if sheet.status.startswith("Errore"):
+        return max(1, len(sheet.human_errors))
+    anomalie_cert = sum(1 for u in sheet.certificate_usages if u.is_expired_at_use or u.used_before_emission or u.is_congruent is False)
+    return len(sheet.human_errors) + anomalie_cert
+
+
+def _riga_csv(sheet: InstrumentSheet) -> dict:
+    usages = sheet.certificate_usages
+    return {
+        "file_path": sheet.file_path, "file": sheet.base_filename, "tipo_scheda": sheet.file_type or "",
+        "tipologia_strumento": sheet.tipologia_strumento or "", "modello_l9": sheet.modello_l9 or "",
+        "data_scheda": sheet.card_date.strftime('%d/%m/%Y') if sheet.card_date else "",
+        "stato": sheet.status, "valida": sheet.is_valid,
+        "errori_compilazione": "; ".join(e.key for e in sheet.human_errors),
+        "certificati": "; ".join(u.certificate_id for u in usages),
+        "usi_scaduti": sum(1 for u in usages if u.is_expired_at_use),
+        "usi_prima_emissione": sum(1 for u in usages if u.used_before_emission),
+        "usi_incongrui": sum(1 for u in usages if u.is_congruent is False),
+        "anomalie": conta_anomalie(sheet),
+    }
+
+
+def percorso_output_predefinito(formato: str) -> str:
+    timestamp_str = config.ANALYSIS_DATETIME.astimezone().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(config.LOGS_DIR, f"risultati_analisi_{timestamp_str}.{formato}")
+
+
+def run_batch(output_path: Optional[str] = None, formato: str = "jsonl", folder_path: Optional[str] = None) -> int:
+    """
+    Analizza tutte le schede della cartella e scrive un record per scheda (JSON Lines o CSV),
+    man mano che i risultati arrivano. Richiede config.load_config() già eseguito.
+    Restituisce EXIT_OK, EXIT_ANOMALIE se almeno una scheda ha anomalie, EXIT_ERRORE se l'analisi non è possibile.
+    """
+    if formato not in FORMATI_OUTPUT:
+        logger.error(f"Formato di output non supportato: {formato}. Ammessi: {', '.join(FORMATI_OUTPUT)}")
+        return EXIT_ERRORE
+    folder_path = folder_path or config.FOLDER_PATH_DEFAULT
+    if not folder_path or not os.path.isdir(folder_path):
+        logger.error(f"Cartella schede non valida: {folder_path}")
+        return EXIT_ERRORE
+    output_path = output_path or percorso_output_predefinito(formato)
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    registro = RegistryIndex(load_registry() or [])
+    file_paths = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path)) if f.lower().endswith(('.xls', '.xlsx')) and not f.startswith('~')]
+    totale = len(file_paths)
+    logger.info(f"Analisi batch di {totale} file in '{folder_path}'. Output: {output_path}")
+
+    schede_con_anomalie = schede_in_errore = 0
+    utilizzi = []
+    profilo = ProfiloRegole() if config.PROFILA_REGOLE else None
+    raw_data_cache = open_raw_data_cache()
+    try:
+        with open(output_path, "w", encoding="utf-8", newline="") as out:
+            writer = None
+            if formato == "csv":
+                writer = csv.DictWriter(out, fieldnames=CSV_COLONNE, delimiter=";")
+                writer.writeheader()
+            for i, (file_path, sheet, error) in enumerate(engine.analyze_files(file_paths, registro, raw_data_cache, profilo=profilo), start=1):
+                if error is not None: schede_in_errore += 1
+                if conta_anomalie(sheet): schede_con_anomalie += 1
+                utilizzi.extend(analysis.utilizzi_conteggiati([sheet]))
+                if writer is not None:
+                    writer.writerow(_riga_csv(sheet))
+                else:
+                    out.write(json.dumps(asdict(sheet), default=_json_default, ensure_ascii=False) + "\n")
+                if i % INTERVALLO_LOG_AVANZAMENTO == 0 or i == totale:
+                    out.flush()
+                    logger.info(f"Avanzamento: {i}/{totale} file elaborati, {schede_con_anomalie} con anomalie.")
+    finally:
+        if raw_data_cache is not None:
+            logger.info(raw_data_cache.summary())
+            raw_data_cache.close()
+
+    analysis.riepilogo_temporale(utilizzi)
+    if profilo is not None:
+        riporta_profilo(profilo)
+    logger.info(f"Analisi batch completata: {totale} file, {schede_con_anomalie} con anomalie ({schede_in_errore} non elaborabili). Risultati in {output_path}")
+    return EXIT_ANOMALIE if schede_con_anomalie else EXIT_OK
+
+
+def leggi_errori_risultati(risultati_path: str) -> dict:
+    """Chiavi di errore per scheda da un file di risultati batch (JSON Lines o CSV, riconosciuto dall'estensione)."""
+    errori = {}
+    with open(risultati_path, encoding="utf-8", newline="") as f:
+        if risultati_path.lower().endswith(".csv"):
+            for row in csv.DictReader(f, delimiter=";"):
+                errori[row["file_path"]] = [k for k in row["errori_compilazione"].split("; ") if k]
+        else:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    errori[record["file_path"]] = [e["key"] for e in record["human_errors"]]
+    return errori
+
+
+def run_simulazione_regole(risultati_path: str, output_path: Optional[str] = None) -> int:
+    """
+    Simula le regole attuali di RegoleValidazione sulle schede di un precedente file di risultati
+    batch, usando i raw_data della cache (le schede non vengono aperte), e riporta quali schede
+    acquistano o perdono chiavi di errore; con `output_path` il dettaglio viene scritto anche in CSV.
+    Le schede modificate dopo quell'analisi o assenti dalla cache non sono simulabili e vengono contate a parte.
+    """
+    if not os.path.isfile(risultati_path):
+        logger.error(f"File di risultati non trovato: {risultati_path}")
+        return EXIT_ERRORE
+    raw_data_cache = open_raw_data_cache()
+    if raw_data_cache is None:
+        logger.error("La simulazione delle regole richiede la cache dei dati grezzi (USA_CACHE_DATI_GREZZI).")
+        return EXIT_ERRORE
+    errori_precedenti = leggi_errori_risultati(risultati_path)
+    raw_data = {}
+    try:
+        for file_path in errori_precedenti:
+            dati = raw_data_cache.get(file_path)
+            if dati is not None: raw_data[file_path] = dati
+    finally:
+        raw_data_cache.close()
+    non_simulabili = len(errori_precedenti) - len(raw_data)
+    if non_simulabili:
+        logger.warning(f"{non_simulabili} schede non simulabili (modificate dopo l'analisi o assenti dalla cache).")
+
+    registro = RegistryIndex(load_registry() or [])
+    profilo = ProfiloRegole() if config.PROFILA_REGOLE else None
+    variazioni = engine.simula_regole(raw_data, registro, errori_precedenti, profilo)
+    logger.info(engine.riepilogo_variazioni(variazioni, len(raw_data)))
+    if profilo is not None:
+        riporta_profilo(profilo)
+    if output_path:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path, "w", encoding="utf-8", newline="") as out:
+            writer = csv.writer(out, delimiter=";")
+            writer.writerow(["file_path", "file", "chiavi_aggiunte", "chiavi_rimosse"])
+            for v in variazioni:
+                writer.writerow([v.file_path, os.path.basename(v.file_path), "; ".join(v.aggiunte), "; ".join(v.rimosse)])
+        logger.info(f"Variazioni scritte in {output_path}")
+    return EXIT_OK
@@ -0,0 +1,295 @@
+# analyzer_app/cache.py
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
+from . import config, layouts
+from .data_models import CalibrationStandard
+
+logger = logging.getLogger(__name__)
+
+# Da incrementare quando cambia il contenuto di raw_data prodotto da excel_io.
+RAW_DATA_SCHEMA_VERSION = 1
+# Da incrementare quando cambia il modo in cui excel_io interpreta il registro strumenti.
+REGISTRY_SNAPSHOT_VERSION = 2
+
+
+def raw_data_version() -> str:
+    """
+    Versione dei dati grezzi: cambia se cambia lo schema, il lettore .xlsx (XLSX_READER_MODE) o una
+    qualsiasi cella letta dai layout registrati, così le voci prodotte diversamente non vengono riusate.
+    """
+    firma = repr((RAW_DATA_SCHEMA_VERSION, config.XLSX_READER_MODE, [
+        (layout.file_type, layout.marker_e2, sorted(layout.fields.items()), sorted((k, tuple(v)) for k, v in layout.slot_fields.items()))
+        for layout in layouts.LAYOUT_REGISTRY.values()
+    ]))
+    return hashlib.sha1(firma.encode("utf-8")).hexdigest()[:16]
+
+
+def file_signature(file_path: str) -> Tuple[str, int, int]:
+    """(percorso assoluto, dimensione, mtime in ns) del file: la chiave della cache."""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+class RawDataCache:
+    """
+    Cache su disco (SQLite) dei raw_data estratti dalle schede.
+
+    Una voce è valida solo se percorso, dimensione, mtime e versione dei layout coincidono
+    con quelli del file attuale. La dimensione totale è limitata: oltre `max_bytes` vengono
+    eliminate le voci usate meno di recente.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.version = raw_data_version()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS raw_data ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, version TEXT NOT NULL,"
+            " payload BLOB NOT NULL, nbytes INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_raw_data_last_access ON raw_data(last_access)")
+        self._conn.commit()
+
+    def get(self, file_path: str) -> Optional[dict]:
+        """raw_data in cache per il file, oppure None se assente o non più valido."""
+        try:
+            path, size, mtime_ns = file_signature(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+        row = self._conn.execute(
+            "SELECT payload FROM raw_data WHERE path = ? AND size = ? AND mtime_ns = ? AND version = ?",
+            (path, size, mtime_ns, self.version),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE raw_data SET last_access = ? WHERE path = ?", (time.time(), path))
+        raw_data = pickle.loads(row[0])
+        # Il percorso con cui è stato chiesto il file può differire da quello salvato (es. relativo/assoluto).
+        raw_data['file_path'] = file_path
+        return raw_data
+
+    def put(self, file_path: str, raw_data: dict, signature: Optional[Tuple[str, int, int]] = None):
+        """
+        Salva i raw_data di un file. `signature` è la firma presa prima della lettura: se il
+        file cambia durante la lettura la voce non corrisponderà più e verrà riletto.
+        """
+        try:
+            path, size, mtime_ns = signature or file_signature(file_path)
+        except OSError:
+            return
+        payload = pickle.dumps(raw_data, protocol=pickle.HIGHEST_PROTOCOL)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO raw_data (path, size, mtime_ns, version, payload, nbytes, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, self.version, payload, len(payload), time.time()),
+        )
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM raw_data").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        for path, nbytes in self._conn.execute("SELECT path, nbytes FROM raw_data ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM raw_data WHERE path = ?", (path,))
+            total -= nbytes
+            removed += 1
+        logger.info(f"Cache dati grezzi: eliminate {removed} voci meno recenti (limite {self.max_bytes} byte).")
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        ratio = f" ({self.hits / total:.0%} hit)" if total else ""
+        return f"Cache dati grezzi: {self.hits} hit, {self.misses} miss{ratio}."
+
+    def close(self):
+        """Applica il limite di dimensione e salva le modifiche."""
+        try:
+            self._evict()
+            self._conn.commit()
+        finally:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_raw_data_cache() -> Optional[RawDataCache]:
+    """Apre la cache configurata in config; None se disabilitata o non apribile (l'analisi prosegue senza)."""
+    if not config.USA_CACHE_DATI_GREZZI:
+        return None
+    db_path = os.path.join(config.CACHE_DIR, config.CACHE_DATI_GREZZI_FILENAME)
+    try:
+        return RawDataCache(db_path, config.CACHE_DATI_GREZZI_MAX_MB * 1024 * 1024)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Cache dati grezzi non disponibile ({db_path}): {e}")
+        return None
+
+
+def registry_signature(registry_path: str) -> tuple:
+    """
+    Chiave dello snapshot del registro: file (percorso, dimensione, mtime) e configurazione
+    delle colonne REGISTRO_*, così uno snapshot letto con colonne diverse non viene riusato.
+    """
+    colonne = tuple((name, getattr(config, name)) for name in sorted(dir(config)) if name.startswith("REGISTRO_"))
+    return (REGISTRY_SNAPSHOT_VERSION, file_signature(registry_path), colonne)
+
+
+def _senza_timestamp(strumenti: List[CalibrationStandard]) -> List[CalibrationStandard]:
+    # Le date di emissione calcolate con pandas sono Timestamp: convertite in datetime lo
+    # snapshot si carica senza importare pandas.
+    return [replace(s, data_emissione=s.data_emissione.to_pydatetime()) if hasattr(s.data_emissione, "to_pydatetime") else s
+            for s in strumenti]
+
+
+class RegistrySnapshot:
+    """
+    Snapshot su disco (pickle) degli strumenti campione letti dal registro.
+
+    Il registro è spesso su una cartella di rete e cambia raramente: finché file e
+    configurazione delle colonne non cambiano, lo snapshot sostituisce la lettura con pandas.
+    Le ricostruzioni sono serializzate, così un controllo in background e un'analisi non
+    leggono il registro due volte in parallelo.
+    """
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        # Firma dello snapshot su disco, se già letta o scritta da questo processo.
+        self._firma_salvata: Optional[tuple] = None
+
+    def _leggi_firma(self, f) -> Optional[tuple]:
+        # La firma è il primo record del file: si legge senza caricare gli strumenti.
+        self._firma_salvata = pickle.load(f)
+        return self._firma_salvata
+
+    def _leggi_snapshot(self, signature: tuple, solo_firma: bool = False):
+        """Strumenti dello snapshot se la firma coincide (con `solo_firma`, True), altrimenti None."""
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                if self._leggi_firma(f) != signature:
+                    return None
+                return True if solo_firma else pickle.load(f)
+        except FileNotFoundError:
+            self._firma_salvata = None
+            return None
+        except Exception as e:
+            logger.warning(f"Snapshot registro non leggibile ({self.snapshot_path}), verrà ricostruito: {e}")
+            self._firma_salvata = None
+            return None
+
+    def _scrivi_snapshot(self, signature: tuple, strumenti: List[CalibrationStandard]):
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(signature, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(strumenti, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+            self._firma_salvata = signature
+        except OSError as e:
+            logger.warning(f"Impossibile salvare lo snapshot del registro ({self.snapshot_path}): {e}")
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+
+    def is_valid(self) -> bool:
+        """
+        True se lo snapshot corrisponde al registro configurato (file e colonne). Il confronto usa la
+        firma già nota al processo; altrimenti legge dal file solo la firma, non gli strumenti.
+        """
+        try:
+            signature = registry_signature(config.FILE_REGISTRO_STRUMENTI)
+        except (OSError, TypeError):
+            return False
+        if self._firma_salvata is not None and os.path.exists(self.snapshot_path):
+            return self._firma_salvata == signature
+        return self._leggi_snapshot(signature, solo_firma=True) is not None
+
+    def load(self) -> Optional[List[CalibrationStandard]]:
+        """
+        Strumenti campione del registro configurato: dallo snapshot se ancora valido,
+        altrimenti letti con excel_io.leggi_registro_strumenti() e salvati per le volte successive.
+        """
+        from . import excel_io
+        registry_path = config.FILE_REGISTRO_STRUMENTI
+        try:
+            signature = registry_signature(registry_path)
+        except (OSError, TypeError):
+            return excel_io.leggi_registro_strumenti()  # registro mancante: segnalato da excel_io
+
+        with self._lock:
+            strumenti = self._leggi_snapshot(signature)
+            if strumenti is not None:
+                logger.info(f"Letti {len(strumenti)} strumenti dallo snapshot del registro ({self.snapshot_path}).")
+                return strumenti
+            strumenti = excel_io.leggi_registro_strumenti()
+            if strumenti is None:
+                return None
+            strumenti = _senza_timestamp(strumenti)
+            self._scrivi_snapshot(signature, strumenti)
+            logger.info(f"Snapshot del registro aggiornato: {self.snapshot_path}")
+            return strumenti
+
+    def refresh_if_stale(self) -> bool:
+        """Ricostruisce lo snapshot se il registro è cambiato. True se è stato ricostruito."""
+        if not config.FILE_REGISTRO_STRUMENTI or self.is_valid():
+            return False
+        logger.info("Registro strumenti modificato: ricostruzione dello snapshot in background.")
+        return self.load() is not None
+
+
+class RegistrySnapshotWatcher(threading.Thread):
+    """Thread in background che ricostruisce lo snapshot del registro quando il file sorgente cambia."""
+
+    def __init__(self, snapshot: RegistrySnapshot, interval: float):
+        super().__init__(name="RegistrySnapshotWatcher", daemon=True)
+        self.snapshot = snapshot
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.snapshot.refresh_if_stale()
+            except Exception as e:
+                logger.warning(f"Controllo dello snapshot del registro non riuscito: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_registry_snapshot: Optional[RegistrySnapshot] = None
+
+
+def get_registry_snapshot() -> RegistrySnapshot:
+    """Snapshot del registro configurato in config (unico per processo)."""
+    global _registry_snapshot
+    snapshot_path = os.path.join(config.CACHE_DIR, config.SNAPSHOT_REGISTRO_FILENAME)
+    if _registry_snapshot is None or _registry_snapshot.snapshot_path != snapshot_path:
+        _registry_snapshot = RegistrySnapshot(snapshot_path)
+    return _registry_snapshot
+
+
+def load_registry() -> Optional[List[CalibrationStandard]]:
+    """Strumenti campione del registro, dallo snapshot locale se abilitato in config."""
+    if not config.USA_SNAPSHOT_REGISTRO:
+        from . import excel_io
+        return excel_io.leggi_registro_strumenti()
+    return get_registry_snapshot().load()
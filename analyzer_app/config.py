@@ -4,7 +4,6 @@ import os
 import sys
 import re
 from datetime import datetime, timezone
-import pandas as pd
 
 # --- Variabili di configurazione che verranno popolate da load_config() ---
 FILE_REGISTRO_STRUMENTI = None
@@ -40,6 +39,31 @@ REGISTRO_COL_IDX_SCADENZA_CAMPIONE = 18
 REGISTRO_RIGA_INIZIO_DATI = 7
 REGISTRO_FOGLIO_NOME = "strumenti campione ISAB SUD"
 SOGLIA_PER_SUGGERIMENTO_ALTERNATIVO = 5
+NUM_ALTERNATIVE_SUGGERITE = 3  # alternative calcolate per ogni utilizzo segnalato dopo l'analisi
+
+# --- Lettura delle schede .xlsx ---
+# "single_pass": apre il pacchetto una sola volta e legge valori in cache e formule nella stessa scansione.
+# "openpyxl": carica la cartella due volte con openpyxl (data_only=True/False), modalità storica.
+XLSX_READER_MODE = "single_pass"
+
+# --- Elaborazione parallela ---
+NUM_PROCESSI_ANALISI = None  # None = numero di core disponibili
+TIMEOUT_ELABORAZIONE_FILE_SEC = 30
+
+# --- Cache dei dati grezzi letti dalle schede ---
+USA_CACHE_DATI_GREZZI = True
+CACHE_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, '..', 'cache'))
+CACHE_DATI_GREZZI_FILENAME = "raw_data_cache.sqlite"
+CACHE_DATI_GREZZI_MAX_MB = 200
+
+# --- Snapshot locale del registro strumenti ---
+USA_SNAPSHOT_REGISTRO = True
+SNAPSHOT_REGISTRO_FILENAME = "registro_strumenti.pickle"
+INTERVALLO_CONTROLLO_REGISTRO_SEC = 60  # ogni quanto la GUI controlla se il registro è cambiato
+
+# --- Profilo dei controlli e delle regole di validazione ---
+PROFILA_REGOLE = False  # attivabile con --profila-regole; tabella nel log e CSV nella cartella dei log
+PROFILO_REGOLE_FILENAME_TEMPLATE = "profilo_regole_{timestamp}.csv"
 
 # --- Costanti per le Schede (Coordinate Celle) ---
 SCHEDA_DIG_CELL_TIPOLOGIA_STRUM = "N10"
@@ -118,6 +142,8 @@ for tipologia_regola, item_regola in REGOLE_CONGRUITA_CERTIFICATI_NORMALIZZATE.i
 
 LISTA_UM_PRESSIONE_RICONOSCIUTE = sorted(["bar","barg","bara","mbar","mbarg","mbara","pa","kpa","mpa","psi","psig","psia","mmh2o","cmh2o","mh2o","mmhg","cmhg","mhg","kg/cm2"])
 MAPPA_NORMALIZZAZIONE_UM = {"mm h2o":"mmh2o","mmh₂o":"mmh2o","mm H₂O":"mmh2o","mm H2O":"mmh2o","kg/cm²":"kg/cm2","kg/cm^2":"kg/cm2","milliampere":"ma","milli ampere":"ma","milliamperes":"ma","mamp":"ma","percent":"%","percentage":"%"}
+DIMENSIONE_CACHE_NORMALIZZAZIONE = 4096  # valori grezzi distinti memorizzati per ciascuna funzione di normalizzazione
+DIMENSIONE_CACHE_ALTERNATIVE = 4096  # ricerche di alternative (range richiesto, data) memorizzate per registro
 RANGE_0_100_NORMALIZZATO="0-100";RANGE_4_20_NORMALIZZATO="4-20";UM_MA_NORMALIZZATA="ma";UM_PERCENTO_NORMALIZZATA="%";UM_MMH2O_NORMALIZZATA="mmh2o";UM_MM_NORMALIZZATA="mm";UM_PSI_NORMALIZZATA="psi"
 
 human_error_messages_map_descriptive = {
@@ -152,42 +178,61 @@ def excel_coord_to_indices(coord_str):
     for char_i,char_v in enumerate(reversed(col_s)):col_idx+=(ord(char_v)-ord('A')+1)*(26**char_i)
     return int(row_s)-1,col_idx-1
 
+def _read_sheet_rows(sheet_name):
+    """Valori del foglio del file parametri come lista di tuple (riga 1 inclusa), letti con openpyxl in sola lettura."""
+    from openpyxl import load_workbook
+    wb = load_workbook(PATH_FILE_PARAMETRI, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames: raise ValueError(f"Foglio '{sheet_name}' non trovato in '{PATH_FILE_PARAMETRI}'.")
+        return [tuple(row) for row in wb[sheet_name].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+def _cell(rows, row_idx, col_idx):
+    """Valore della cella (indici 0-based); IndexError se fuori dall'area usata del foglio."""
+    row = rows[row_idx]
+    if col_idx >= len(row): raise IndexError(col_idx)
+    return row[col_idx]
+
+def _is_blank(value) -> bool:
+    return value is None or str(value).strip() == ""
+
 def load_config():
     global FILE_REGISTRO_STRUMENTI, FOLDER_PATH_DEFAULT, FILE_DATI_COMPILAZIONE_SCHEDE
     global FILE_MASTER_DIGITALE_XLSX, FILE_MASTER_ANALOGICO_XLSX, LOGS_DIR
     LOGS_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, '..', 'logs'))
     if not os.path.exists(PATH_FILE_PARAMETRI):
         raise FileNotFoundError(f"ERRORE CRITICO: File parametri '{PATH_FILE_PARAMETRI}' non trovato.")
-    df_params = pd.read_excel(PATH_FILE_PARAMETRI, sheet_name=NOME_FOGLIO_PARAMETRI, header=None, engine='openpyxl', dtype=str)
+    params_rows = _read_sheet_rows(NOME_FOGLIO_PARAMETRI)
     try:
-        path_registro_letto = df_params.iloc[1, 1]
-        if pd.isna(path_registro_letto) or str(path_registro_letto).strip() == "": raise ValueError("Cella B2 (FILE_REGISTRO_STRUMENTI) nel file parametri è vuota o non valida.")
+        path_registro_letto = _cell(params_rows, 1, 1)
+        if _is_blank(path_registro_letto): raise ValueError("Cella B2 (FILE_REGISTRO_STRUMENTI) nel file parametri è vuota o non valida.")
         FILE_REGISTRO_STRUMENTI = str(path_registro_letto).strip()
         if not os.path.exists(FILE_REGISTRO_STRUMENTI): raise FileNotFoundError(f"File registro strumenti specificato in B2 non trovato: {FILE_REGISTRO_STRUMENTI}")
     except IndexError: raise ValueError(f"Cella B2 non trovata nel foglio '{NOME_FOGLIO_PARAMETRI}'.")
     try:
-        path_schede_letto = df_params.iloc[2, 1]
-        if pd.isna(path_schede_letto) or str(path_schede_letto).strip() == "": raise ValueError("Cella B3 (FOLDER_PATH_DEFAULT) nel file parametri è vuota o non valida.")
+        path_schede_letto = _cell(params_rows, 2, 1)
+        if _is_blank(path_schede_letto): raise ValueError("Cella B3 (FOLDER_PATH_DEFAULT) nel file parametri è vuota o non valida.")
         FOLDER_PATH_DEFAULT = str(path_schede_letto).strip()
         if not os.path.isdir(FOLDER_PATH_DEFAULT): raise NotADirectoryError(f"Cartella schede specificata in B3 non trovata: {FOLDER_PATH_DEFAULT}")
     except IndexError: raise ValueError(f"Cella B3 non trovata nel foglio '{NOME_FOGLIO_PARAMETRI}'.")
     try:
-        path_compilazione_letto = df_params.iloc[3, 1]
-        if not (pd.isna(path_compilazione_letto) or str(path_compilazione_letto).strip() == ""):
+        path_compilazione_letto = _cell(params_rows, 3, 1)
+        if not _is_blank(path_compilazione_letto):
             path = str(path_compilazione_letto).strip()
             if os.path.exists(path): FILE_DATI_COMPILAZIONE_SCHEDE = path
             else: print(f"AVVISO: File dati compilazione specificato in B4 non trovato: {path}", file=sys.stderr)
     except IndexError: pass
     try:
-        path_master_dig_letto = df_params.iloc[4, 1]
-        if not (pd.isna(path_master_dig_letto) or str(path_master_dig_letto).strip() == ""):
+        path_master_dig_letto = _cell(params_rows, 4, 1)
+        if not _is_blank(path_master_dig_letto):
             path = str(path_master_dig_letto).strip()
             if os.path.exists(path) and path.lower().endswith(".xlsx"): FILE_MASTER_DIGITALE_XLSX = path
             else: print(f"AVVISO: File master digitale B5 non trovato o non .xlsx: {path}", file=sys.stderr)
     except IndexError: pass
     try:
-        path_master_ana_letto = df_params.iloc[5, 1]
-        if not (pd.isna(path_master_ana_letto) or str(path_master_ana_letto).strip() == ""):
+        path_master_ana_letto = _cell(params_rows, 5, 1)
+        if not _is_blank(path_master_ana_letto):
             path = str(path_master_ana_letto).strip()
             if os.path.exists(path) and path.lower().endswith(".xlsx"): FILE_MASTER_ANALOGICO_XLSX = path
             else: print(f"AVVISO: File master analogico B6 non trovato o non .xlsx: {path}", file=sys.stderr)
@@ -198,18 +243,48 @@ def _load_validation_rules():
     global VALIDATION_RULES
     VALIDATION_RULES = []
     try:
-        df_rules = pd.read_excel(PATH_FILE_PARAMETRI, sheet_name=NOME_FOGLIO_REGOLE, header=0, engine='openpyxl')
-        df_rules.columns = [col.strip() for col in df_rules.columns]
-        df_rules = df_rules.dropna(how='all')
-        for index, row in df_rules.iterrows():
-            is_active = str(row.get('IsActive', 'FALSE')).strip().upper()
+        rules_rows = _read_sheet_rows(NOME_FOGLIO_REGOLE)
+        header = [str(col).strip() if col is not None else "" for col in rules_rows[0]] if rules_rows else []
+        for excel_row, values in enumerate(rules_rows[1:], start=2):
+            if all(_is_blank(v) for v in values): continue
+            row = {col: ("" if v is None else str(v)) for col, v in zip(header, values) if col}
+            is_active = row.get('IsActive', 'FALSE').strip().upper()
             if is_active != 'TRUE': continue
-            rule = { 'TipologiaStrumento': str(row.get('TipologiaStrumento', '*')).strip().upper() or '*', 'ModelloL9': str(row.get('ModelloL9 (Optional)', '*')).strip().upper() or '*', 'CampoA': str(row.get('CampoA', '')).strip(), 'Operatore': str(row.get('Operatore', '')).strip(), 'CampoB_o_Costante': str(row.get('CampoB_o_Costante', '')).strip(), 'ChiaveErrore': str(row.get('ChiaveErrore', '')).strip() }
+            rule = { 'TipologiaStrumento': row.get('TipologiaStrumento', '*').strip().upper() or '*', 'ModelloL9': row.get('ModelloL9 (Optional)', '*').strip().upper() or '*', 'CampoA': row.get('CampoA', '').strip(), 'Operatore': row.get('Operatore', '').strip(), 'CampoB_o_Costante': row.get('CampoB_o_Costante', '').strip(), 'ChiaveErrore': row.get('ChiaveErrore', '').strip() }
             if rule['CampoA'] and rule['Operatore'] and rule['ChiaveErrore']: VALIDATION_RULES.append(rule)
-            else: print(f"AVVISO: Regola alla riga {index + 2} nel foglio '{NOME_FOGLIO_REGOLE}' ignorata perché incompleta.", file=sys.stderr)
+            else: print(f"AVVISO: Regola alla riga {excel_row} nel foglio '{NOME_FOGLIO_REGOLE}' ignorata perché incompleta.", file=sys.stderr)
         print(f"INFO: Caricate {len(VALIDATION_RULES)} regole di validazione personalizzate dal foglio '{NOME_FOGLIO_REGOLE}'.")
     except ValueError: print(f"INFO: Foglio '{NOME_FOGLIO_REGOLE}' non trovato nel file dei parametri. Verrà usata la logica di validazione hardcoded.")
     except Exception as e: print(f"AVVISO: Impossibile caricare le regole di validazione personalizzate dal foglio '{NOME_FOGLIO_REGOLE}'. Errore: {e}", file=sys.stderr)
+    motore_regole()
+
+_MOTORE_REGOLE = None
+
+def motore_regole():
+    """Regole di validazione compilate (rules.RuleEngine), ricompilate solo se VALIDATION_RULES è stato sostituito."""
+    global _MOTORE_REGOLE
+    if _MOTORE_REGOLE is None or _MOTORE_REGOLE.rules is not VALIDATION_RULES:
+        from .rules import RuleEngine
+        _MOTORE_REGOLE = RuleEngine(VALIDATION_RULES)
+    return _MOTORE_REGOLE
+
+# Stato caricato a runtime da load_config() che i processi di analisi devono ricevere dal processo principale.
+RUNTIME_STATE_KEYS = (
+    "FILE_REGISTRO_STRUMENTI", "FOLDER_PATH_DEFAULT", "FILE_DATI_COMPILAZIONE_SCHEDE",
+    "FILE_MASTER_DIGITALE_XLSX", "FILE_MASTER_ANALOGICO_XLSX", "VALIDATION_RULES",
+    "ANALYSIS_DATETIME", "LOGS_DIR", "XLSX_READER_MODE", "PROFILA_REGOLE",
+)
+
+def export_runtime_state() -> dict:
+    """Fotografia dello stato di configurazione corrente, da passare ai processi di analisi."""
+    module_globals = globals()
+    return {key: module_globals[key] for key in RUNTIME_STATE_KEYS}
+
+def apply_runtime_state(state: dict):
+    """Applica in un processo di analisi lo stato esportato con export_runtime_state()."""
+    globals().update({key: value for key, value in state.items() if key in RUNTIME_STATE_KEYS})
+    if "VALIDATION_RULES" in state:
+        motore_regole()  # le funzioni compilate non passano tra processi: ogni processo compila le sue
 
 def _determine_log_filepath():
     global LOG_FILEPATH, LOGS_DIR
@@ -49,6 +49,7 @@ class SheetError:
     description: str
     cell: Optional[str] = None
     suggestion: Optional[str] = None
+    from_rule: bool = False  # True se prodotto da una regola del foglio RegoleValidazione
 
 @dataclass
 class InstrumentSheet:
@@ -0,0 +1,183 @@
+# analyzer_app/engine.py
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import config, excel_io, analysis
+from .cache import RawDataCache, file_signature
+from .data_models import CalibrationStandard, InstrumentSheet
+from .profiling import ProfiloRegole
+from .registry import RegistryIndex
+from .workers import SheetWorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Registro campioni indicizzato disponibile nel processo di analisi, impostato da _init_worker.
+_registro: RegistryIndex = RegistryIndex([])
+
+
+@dataclass
+class AnalysisRun:
+    """Stato di un'esecuzione completa o incrementale, riusato dalla successiva analisi incrementale."""
+    strumenti_campione: List[CalibrationStandard]
+    validation_rules: List[dict]
+    sheets: Dict[str, InstrumentSheet] = field(default_factory=dict)
+    raw_data: Dict[str, dict] = field(default_factory=dict)
+    signatures: Dict[str, Tuple[str, int, int]] = field(default_factory=dict)
+    # Conteggi dell'ultima esecuzione: riusati, rianalizzati parzialmente, letti.
+    riusati: int = 0
+    parziali: int = 0
+    letti: int = 0
+
+    def summary(self) -> str:
+        return f"Schede riusate: {self.riusati}, riverificate: {self.parziali}, lette: {self.letti}."
+
+
+@dataclass
+class VariazioneErrori:
+    """Chiavi di errore che una scheda acquista o perde ripetendo l'analisi con le regole attuali."""
+    file_path: str
+    aggiunte: List[str]
+    rimosse: List[str]
+
+
+def _init_worker(config_state: dict, registro: RegistryIndex):
+    """Inizializzatore dei processi del pool: riceve configurazione e registro indicizzato una sola volta."""
+    global _registro
+    config.apply_runtime_state(config_state)
+    _registro = registro
+
+
+def analyze_file(task: Tuple[str, Optional[dict], Optional[InstrumentSheet], bool, bool]) -> Tuple[InstrumentSheet, Optional[dict], Optional[ProfiloRegole]]:
+    """
+    Lettura e analisi di una scheda; eseguita nei processi del pool. Il task è
+    (percorso, raw_data, risultato precedente, regole, certificati):
+    - senza raw_data il file viene letto;
+    - con un risultato precedente vengono ripetuti solo gli stadi indicati (regole e/o certificati).
+    Restituisce l'InstrumentSheet, i raw_data appena letti (None se arrivavano con il task) e,
+    con config.PROFILA_REGOLE, il profilo di controlli e regole della scheda.
+    """
+    file_path, raw_data, precedente, regole, certificati = task
+    letti = None
+    if raw_data is None:
+        raw_data = letti = excel_io.read_instrument_sheet_raw_data(file_path)
+    profilo = ProfiloRegole() if config.PROFILA_REGOLE else None
+    if precedente is not None:
+        return analysis.riesegui_verifiche(precedente, raw_data, _registro, regole=regole, certificati=certificati, profilo=profilo), letti, profilo
+    return analysis.analyze_sheet_data(raw_data, _registro, profilo), letti, profilo
+
+
+def analyze_files(file_paths: Iterable[str], registro: RegistryIndex,
+                  cache: Optional[RawDataCache] = None, previous: Optional[AnalysisRun] = None,
+                  run: Optional[AnalysisRun] = None,
+                  profilo: Optional[ProfiloRegole] = None) -> Iterator[Tuple[str, InstrumentSheet, Optional[BaseException]]]:
+    """
+    Analizza le schede in parallelo e restituisce (percorso, InstrumentSheet, errore) nell'ordine di
+    completamento. Un file che fallisce o supera il timeout produce un InstrumentSheet di errore
+    insieme all'eccezione; per gli altri l'errore è None.
+
+    Con una cache i file invariati non vengono riletti e quelli letti vengono salvati. Con
+    `previous` (analisi incrementale) i file invariati riusano il risultato precedente e, se sono
+    cambiati registro o regole, ripetono solo la verifica certificati o la validazione regole.
+    Se `run` è indicato vi vengono registrati firme, raw_data e risultati di ogni file; in `profilo`
+    vengono sommati i profili delle schede analizzate (con config.PROFILA_REGOLE).
+    """
+    registro_cambiato = previous is not None and previous.strumenti_campione != registro.strumenti
+    regole_cambiate = previous is not None and previous.validation_rules != config.VALIDATION_RULES
+    if previous is not None:
+        logger.info(f"Analisi incrementale: registro {'cambiato' if registro_cambiato else 'invariato'}, regole {'cambiate' if regole_cambiate else 'invariate'}.")
+
+    tasks, signatures = [], {}
+    for file_path in file_paths:
+        try:
+            signatures[file_path] = file_signature(file_path)
+        except OSError:
+            pass
+        if previous is not None and file_path in previous.raw_data and previous.signatures.get(file_path) == signatures.get(file_path):
+            precedente = previous.sheets[file_path]
+            raw_data = previous.raw_data[file_path]
+            if not (registro_cambiato or regole_cambiate):
+                if run is not None:
+                    run.riusati += 1
+                    _registra(run, file_path, signatures, raw_data, precedente)
+                yield file_path, precedente, None
+                continue
+            if run is not None: run.parziali += 1
+            tasks.append((file_path, raw_data, precedente, regole_cambiate, registro_cambiato))
+            continue
+        raw_data = cache.get(file_path) if cache is not None else None
+        if run is not None and raw_data is None: run.letti += 1
+        tasks.append((file_path, raw_data, None, False, False))
+    if not tasks:
+        return
+
+    with SheetWorkerPool(analyze_file, processes=config.NUM_PROCESSI_ANALISI, timeout=config.TIMEOUT_ELABORAZIONE_FILE_SEC,
+                         initializer=_init_worker, initargs=(config.export_runtime_state(), registro)) as pool:
+        for (file_path, raw_data, _, _, _), status, result in pool.imap_unordered(tasks):
+            if status == 'success':
+                sheet_result, letti, profilo_scheda = result
+                if profilo is not None and profilo_scheda is not None:
+                    profilo.unisci(profilo_scheda)
+                if letti is not None:
+                    raw_data = letti
+                    if cache is not None and file_path in signatures:
+                        cache.put(file_path, raw_data, signatures[file_path])
+                if run is not None:
+                    _registra(run, file_path, signatures, raw_data, sheet_result)
+                yield file_path, sheet_result, None
+                continue
+            filename = os.path.basename(file_path)
+            logger.error(f"Errore durante l'analisi del file {filename}: {result}", exc_info=result)
+            error_sheet = InstrumentSheet(file_path=file_path, base_filename=filename, status=f"Errore: {result}", is_valid=False)
+            if run is not None:
+                run.sheets[file_path] = error_sheet
+            yield file_path, error_sheet, result
+
+
+def _registra(run: AnalysisRun, file_path: str, signatures: Dict[str, Tuple[str, int, int]], raw_data: dict, sheet: InstrumentSheet):
+    run.sheets[file_path] = sheet
+    run.raw_data[file_path] = raw_data
+    if file_path in signatures:
+        run.signatures[file_path] = signatures[file_path]
+
+
+def simula_regole(raw_data: Dict[str, dict], registro: RegistryIndex,
+                  errori_precedenti: Dict[str, Iterable[str]], profilo: Optional[ProfiloRegole] = None) -> List[VariazioneErrori]:
+    """
+    Ripete analyze_sheet_data (controlli fissi e regole di config.VALIDATION_RULES) sui raw_data
+    già estratti, senza aprire le schede, e li confronta con le chiavi di errore precedenti.
+    L'analisi avviene nel processo corrente: senza lettura dei file il costo per scheda è
+    minimo e il pool costerebbe più del lavoro. Restituisce solo le schede con variazioni,
+    nell'ordine di `errori_precedenti`.
+    """
+    variazioni = []
+    for file_path, precedenti in errori_precedenti.items():
+        dati = raw_data.get(file_path)
+        if dati is None:
+            continue
+        try:
+            attuali = {e.key for e in analysis.analyze_sheet_data(dati, registro, profilo).human_errors}
+        except Exception as e:
+            logger.error(f"Simulazione regole non riuscita per {os.path.basename(file_path)}: {e}", exc_info=True)
+            continue
+        precedenti = set(precedenti)
+        if attuali != precedenti:
+            variazioni.append(VariazioneErrori(file_path, sorted(attuali - precedenti), sorted(precedenti - attuali)))
+    return variazioni
+
+
+def riepilogo_variazioni(variazioni: List[VariazioneErrori], totale: int) -> str:
+    """Testo per log e console: conteggi per chiave di errore e dettaglio per scheda."""
+    if not variazioni:
+        return f"Simulazione regole: nessuna variazione sulle {totale} schede confrontate."
+    per_chiave: Dict[str, List[int]] = {}
+    for variazione in variazioni:
+        for chiave in variazione.aggiunte: per_chiave.setdefault(chiave, [0, 0])[0] += 1
+        for chiave in variazione.rimosse: per_chiave.setdefault(chiave, [0, 0])[1] += 1
+    lines = [f"Simulazione regole: {len(variazioni)} schede su {totale} cambiano.", f"{'+schede':>8} | {'-schede':>8} | chiave di errore"]
+    lines += [f"{aggiunte:8d} | {rimosse:8d} | {chiave}" for chiave, (aggiunte, rimosse) in sorted(per_chiave.items())]
+    for variazione in variazioni:
+        dettaglio = [f"+{k}" for k in variazione.aggiunte] + [f"-{k}" for k in variazione.rimosse]
+        lines.append(f"{os.path.basename(variazione.file_path)}: {' '.join(dettaglio)}")
+    return "\n".join(lines)
@@ -3,15 +3,11 @@ import os
 import re
 import logging
 from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
 from typing import List, Optional
 
-import pandas as pd
-import xlrd
-from itertools import product
-from pandas.tseries.offsets import DateOffset
-from openpyxl import load_workbook
-
 from . import config
+from . import layouts
 from .data_models import CalibrationStandard
 from typing import Dict
 
@@ -19,20 +15,92 @@ logger = logging.getLogger(__name__)
 
 def excel_coord_to_indices(coord_str: str) -> tuple[int, int]:
     """Converte una coordinata Excel (es. "B3") in indici 0-based (riga, colonna)."""
-    match = re.match(r"([A-Z]+)([0-9]+)", coord_str.upper())
-    if not match:
-        raise ValueError(f"Coordinata Excel non valida: {coord_str}")
-    col_s, row_s = match.groups()
-    col_idx = 0
-    for char_i, char_v in enumerate(reversed(col_s)):
-        col_idx += (ord(char_v) - ord('A') + 1) * (26 ** char_i)
-    return int(row_s) - 1, col_idx - 1
+    return layouts.coord_to_indices(coord_str)
+
+def is_na_value(value) -> bool:
+    """Equivalente di pd.isna per un singolo valore (None, NaN, NaT, pd.NA) senza importare pandas."""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:  # pd.NA non è convertibile in bool
+        return True
+
+# Origine dei numeri seriali di Excel (sistema 1900), come origin="1899-12-30" di pandas.
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+# Formati storici di parse_date_robust, nell'ordine in cui vengono provati.
+_DATE_FORMATS = ['%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%m/%d/%Y', '%Y/%m/%d']
+
+
+class _FormaData:
+    """
+    Forma di una data testuale (cifre e separatori) con i formati di _DATE_FORMATS che la accettano,
+    nell'ordine di priorità, come posizioni dei gruppi (giorno, mese, anno). Le forme si escludono
+    a vicenda, quindi una volta riconosciuta la forma non serve provare gli altri formati.
+    """
+
+    def __init__(self, nome: str, pattern: str, ordini: List[tuple]):
+        self.nome = nome
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.ordini = ordini
+
+    def converti(self, token: str) -> Optional[datetime]:
+        match = self.regex.fullmatch(token)
+        if match is None:
+            return None
+        for giorno, mese, anno in self.ordini:
+            try:
+                return datetime(int(match.group(anno)), int(match.group(mese)), int(match.group(giorno)))
+            except ValueError:
+                continue
+        return None
+
+
+_FORME_DATA = (
+    _FormaData("gg/mm/aaaa", r'([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})', [(1, 2, 3), (2, 1, 3)]),  # %d/%m/%Y, poi %m/%d/%Y
+    _FormaData("gg-mm-aaaa", r'([0-9]{1,2})-([0-9]{1,2})-([0-9]{4})', [(1, 2, 3)]),
+    _FormaData("gg.mm.aaaa", r'([0-9]{1,2})\.([0-9]{1,2})\.([0-9]{4})', [(1, 2, 3)]),
+    _FormaData("aaaa-mm-gg", r'([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})', [(3, 2, 1)]),
+    _FormaData("aaaa/mm/gg", r'([0-9]{4})/([0-9]{1,2})/([0-9]{1,2})', [(3, 2, 1)]),
+)
+_SPAZIO = re.compile(r'\s')
+# Ultima forma riconosciuta per file: provata per prima alla data successiva dello stesso file.
+_FORMA_PER_FILE: Dict[str, _FormaData] = {}
+# Date non riconosciute già segnalate (file, testo): le ripetizioni vanno nel log solo a livello DEBUG.
+_DATE_SEGNALATE: set = set()
+_MAX_MEMORIA_DATE = 10000
+
+
+def _converti_token_data(token: str, context_filename: str) -> Optional[datetime]:
+    """Data dal primo token del testo, con lo stesso esito dei formati di _DATE_FORMATS provati in ordine."""
+    if _SPAZIO.search(token):
+        # Solo '%Y-%m-%d %H:%M:%S' accetta spazi diversi da ' ' nel token: caso raro, si provano i formati.
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(token, fmt)
+            except ValueError:
+                continue
+        return None
+    nota = _FORMA_PER_FILE.get(context_filename)
+    if nota is not None and nota.regex.fullmatch(token):
+        return nota.converti(token)
+    for forma in _FORME_DATA:
+        if forma is not nota and forma.regex.fullmatch(token):
+            data = forma.converti(token)
+            if data is not None:
+                if len(_FORMA_PER_FILE) >= _MAX_MEMORIA_DATE: _FORMA_PER_FILE.clear()
+                _FORMA_PER_FILE[context_filename] = forma
+            return data
+    return None
 
 def parse_date_robust(date_val, context_filename: str = "N/A") -> Optional[datetime]:
     """
     Tenta di parsare una data da vari formati (stringa, timestamp, numero seriale Excel).
+    La forma del testo (gg/mm/aaaa, aaaa-mm-gg, ...) viene riconosciuta con un'espressione
+    precompilata e convertita direttamente; in caso di ambiguità vale gg/mm prima di mm/gg.
     """
-    if pd.isna(date_val):
+    if is_na_value(date_val):
         return None
 
     # Gestisce stringhe non-data conosciute che possono apparire legittimamente.
@@ -41,37 +109,130 @@ def parse_date_robust(date_val, context_filename: str = "N/A") -> Optional[datet
         return None
 
     if isinstance(date_val, datetime):
-        return date_val
-    if isinstance(date_val, pd.Timestamp):
-        return date_val.to_pydatetime()
+        # pd.Timestamp è una sottoclasse di datetime: il resto dell'analisi usa datetime semplici.
+        return date_val.to_pydatetime(warn=False) if hasattr(date_val, "to_pydatetime") else date_val
 
     s_date_str = str(date_val).strip()
     if not s_date_str:
         return None
 
-    expected_formats = ['%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
-    common_formats = ['%m/%d/%Y', '%Y/%m/%d']
-    all_formats_to_try = expected_formats + [f for f in common_formats if f not in expected_formats]
-
-    for fmt in all_formats_to_try:
-        try:
-            return datetime.strptime(s_date_str.split(' ')[0], fmt)
-        except ValueError:
-            continue
+    data = _converti_token_data(s_date_str.split(' ')[0], context_filename)
+    if data is not None:
+        return data
 
     try:
         if isinstance(date_val, (int, float)) or (s_date_str.replace('.', '', 1).isdigit()):
             numeric_val = float(s_date_str)
             if 1 < numeric_val < 200000:
+                # Con pandas, come sempre: per le frazioni di giorno l'arrotondamento al microsecondo
+                # differisce da _EXCEL_EPOCH + timedelta (es. 7.1 -> 02:23:59.999999).
+                import pandas as pd
                 return pd.to_datetime(numeric_val, unit='D', origin='1899-12-30').to_pydatetime()
     except (ValueError, TypeError, OverflowError) as e_num:
         logger.debug(f"File: {context_filename} - Parse numerico Excel fallito per '{s_date_str}': {e_num}")
 
-    logger.warning(f"File: {context_filename} - Data '{s_date_str}' (raw: '{date_val}') non riconosciuta.")
+    messaggio = f"File: {context_filename} - Data '{s_date_str}' (raw: '{date_val}') non riconosciuta."
+    if (context_filename, s_date_str) in _DATE_SEGNALATE:
+        logger.debug(messaggio)
+    else:
+        if len(_DATE_SEGNALATE) >= _MAX_MEMORIA_DATE: _DATE_SEGNALATE.clear()
+        _DATE_SEGNALATE.add((context_filename, s_date_str))
+        logger.warning(messaggio)
     return None
 
+# Stringhe che parse_date_robust interpreta come numero seriale Excel (cifre con al più un punto).
+_SERIAL_STRING_PATTERN = r'^(?=.*[0-9])[0-9]*\.?[0-9]*$'
+
+def _date_da_componenti(anni, mesi, giorni):
+    """(maschera delle combinazioni valide nel calendario, date datetime64[D]) da array di anno, mese e giorno."""
+    import numpy as np
+
+    valide = (anni >= 1) & (mesi >= 1) & (mesi <= 12) & (giorni >= 1)
+    anni, mesi, giorni = (np.where(valide, v, 1).astype('int64') for v in (anni, mesi, giorni))
+    inizio_mese = ((anni - 1970) * 12 + mesi - 1).astype('datetime64[M]')
+    giorni_nel_mese = ((inizio_mese + 1).astype('datetime64[D]') - inizio_mese.astype('datetime64[D]')).astype('int64')
+    valide &= giorni <= giorni_nel_mese
+    return valide, inizio_mese.astype('datetime64[D]') + (giorni - 1)
+
+def parse_date_column(values, context_filename: str = "N/A") -> List[Optional[datetime]]:
+    """
+    Versione colonnare di parse_date_robust per una pd.Series: stesso risultato elemento per elemento.
+    I numeri seriali Excel interi e le stringhe nelle forme di _FORME_DATA vengono convertiti in blocco;
+    i valori rimanenti (non stringhe, frazioni, date fuori dall'intervallo di pandas, testo non
+    riconosciuto) passano da parse_date_robust, che ne registra anche gli avvisi.
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = len(values)
+    result: List[Optional[datetime]] = [None] * n
+    obj = values.astype(object).reset_index(drop=True)
+    missing = obj.map(is_na_value).to_numpy(dtype=bool)
+    is_str = obj.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool) & ~missing
+    resolved = missing.copy()
+    text = pd.Series([v.strip() if ok else "" for v, ok in zip(obj.tolist(), is_str)], dtype=object)
+
+    # Numeri seriali Excel interi nell'intervallo accettato da parse_date_robust.
+    serial_mask = is_str & text.str.match(_SERIAL_STRING_PATTERN).fillna(False).to_numpy(dtype=bool)
+    if serial_mask.any():
+        serials = pd.to_numeric(text[serial_mask], errors='coerce').to_numpy(dtype=float)
+        ok = (serials > 1) & (serials < 200000) & (np.floor(serials) == serials)
+        rows = np.flatnonzero(serial_mask)[ok]
+        dates = (np.datetime64(_EXCEL_EPOCH, 'D') + serials[ok].astype('int64').astype('timedelta64[D]')).astype('datetime64[us]').tolist()
+        for row, date in zip(rows, dates): result[row] = date
+        resolved[rows] = True
+
+    # Stringhe per forma, sui soli token distinti: giorno, mese e anno estratti in blocco e convertiti
+    # nell'ordine di priorità dei formati (gg/mm prima di mm/gg).
+    pending = is_str & ~resolved & ~serial_mask
+    if pending.any():
+        rows = np.flatnonzero(pending)
+        codici, unici = pd.factorize(text[pending].str.split(' ', n=1).str[0])
+        date_unici = np.full(len(unici), np.datetime64('NaT'), dtype='datetime64[D]')
+        restanti = np.arange(len(unici))  # token non ancora riconosciuti da una forma
+        for forma in _FORME_DATA:
+            if not len(restanti): break
+            parti = pd.Series(unici[restanti], dtype=object).str.extract('^' + forma.pattern + r'\Z').apply(pd.to_numeric).to_numpy(dtype=float)
+            riconosciuti = ~np.isnan(parti[:, 0])
+            indici, parti = restanti[riconosciuti], parti[riconosciuti]
+            restanti = restanti[~riconosciuti]
+            for giorno, mese, anno in forma.ordini:
+                valide, date = _date_da_componenti(parti[:, anno - 1], parti[:, mese - 1], parti[:, giorno - 1])
+                date_unici[indici[valide]] = date[valide]
+                indici, parti = indici[~valide], parti[~valide]
+        trovate = ~np.isnat(date_unici[codici])
+        for row, date in zip(rows[trovate], date_unici[codici][trovate].astype('datetime64[us]').tolist()): result[row] = date
+        resolved[rows[trovate]] = True
+
+    for row in np.flatnonzero(~resolved):
+        result[row] = parse_date_robust(obj.iat[row], context_filename)
+    return result
+
+def _date_emissione_column(scadenze: List[Optional[datetime]]) -> list:
+    """Data di emissione (scadenza meno un anno, come Timestamp) per ogni scadenza; None se la scadenza manca."""
+    import pandas as pd
+    from pandas.tseries.offsets import DateOffset
+
+    result = [None] * len(scadenze)
+    rows = [i for i, d in enumerate(scadenze) if d and pd.Timestamp.min < d < pd.Timestamp.max]
+    if rows:
+        shifted = pd.DatetimeIndex([scadenze[i] for i in rows]) - DateOffset(years=1)
+        for row, date in zip(rows, shifted): result[row] = date
+    in_blocco = set(rows)
+    for i, scadenza_dt in enumerate(scadenze):
+        if scadenza_dt and i not in in_blocco:
+            try: result[i] = scadenza_dt - DateOffset(years=1)
+            except Exception: result[i] = scadenza_dt - timedelta(days=365)
+    return result
+
+def _text_column(values, upper: bool = False) -> List[str]:
+    """str(valore).strip() (maiuscolo se richiesto) per ogni elemento, "N/D" per i valori mancanti."""
+    testo = values.astype(object).map(lambda v: "N/D" if is_na_value(v) else str(v).strip())
+    if upper:
+        testo = testo.where(testo == "N/D", testo.str.upper())
+    return testo.tolist()
+
 def leggi_registro_strumenti() -> Optional[List[CalibrationStandard]]:
-    # ... (Questa funzione rimane la stessa)
     if not config.FILE_REGISTRO_STRUMENTI:
         logger.error("Percorso FILE_REGISTRO_STRUMENTI non configurato. Impossibile leggere il registro.")
         return None
@@ -81,6 +242,7 @@ def leggi_registro_strumenti() -> Optional[List[CalibrationStandard]]:
         logger.error(f"File registro strumenti NON TROVATO: {config.FILE_REGISTRO_STRUMENTI}")
         return None
 
+    import pandas as pd
     try:
         # The order of columns in usecols must match the order in names.
         # We must sort the columns by index to ensure pandas reads them in the correct order.
@@ -108,29 +270,21 @@ def leggi_registro_strumenti() -> Optional[List[CalibrationStandard]]:
         df_registro.dropna(subset=['id_cert_campione'], inplace=True)
         df_registro = df_registro[df_registro['id_cert_campione'].astype(str).str.strip() != ""]
 
-        strumenti_campione = []
-        for _, row in df_registro.iterrows():
-            id_cert_strum = str(row['id_cert_campione']).strip()
-            if not id_cert_strum: continue
-
-            scadenza_val = row['scadenza_cert_campione']
-            scadenza_dt = parse_date_robust(scadenza_val, config.FILE_REGISTRO_STRUMENTI)
-
-            data_emissione_dt = None
-            if scadenza_dt:
-                try: data_emissione_dt = scadenza_dt - DateOffset(years=1)
-                except Exception: data_emissione_dt = scadenza_dt - timedelta(days=365)
-
-            strumenti_campione.append(
-                CalibrationStandard(
-                    modello_strumento=str(row['modello_strumento_campione']).strip().upper() if not pd.isna(row['modello_strumento_campione']) else "N/D",
-                    id_certificato=id_cert_strum,
-                    range=str(row['range_campione']).strip() if not pd.isna(row['range_campione']) else "N/D",
-                    scadenza=scadenza_dt,
-                    scadenza_raw=str(scadenza_val) if not pd.isna(scadenza_val) else "N/D",
-                    data_emissione=data_emissione_dt
-                )
-            )
+        ids_cert = df_registro['id_cert_campione'].astype(str).str.strip()
+
+        scadenze_raw = df_registro['scadenza_cert_campione']
+        scadenze_dt = parse_date_column(scadenze_raw, config.FILE_REGISTRO_STRUMENTI)
+        date_emissione = _date_emissione_column(scadenze_dt)
+
+        strumenti_campione = list(map(
+            CalibrationStandard,
+            _text_column(df_registro['modello_strumento_campione'], upper=True),
+            ids_cert.tolist(),
+            _text_column(df_registro['range_campione']),
+            scadenze_dt,
+            [str(v) if not is_na_value(v) else "N/D" for v in scadenze_raw.tolist()],
+            date_emissione,
+        ))
         logger.info(f"Letti {len(strumenti_campione)} strumenti validi dal registro.")
         all_registry_ids = [s.id_certificato for s in strumenti_campione]
         logger.debug(f"Loaded {len(all_registry_ids)} certificate IDs from registry: {all_registry_ids}")
@@ -139,120 +293,167 @@ def leggi_registro_strumenti() -> Optional[List[CalibrationStandard]]:
         logger.error(f"Errore imprevisto durante lettura registro strumenti: {e}", exc_info=True)
         return None
 
+def _indici_celle_richieste():
+    """Celle di tutti i layout registrati come (riga, colonna) 1-based, per i lettori e le celle unite."""
+    return [(r + 1, c + 1) for r, c in layouts.INDICI_CELLE_RICHIESTE]
+
+
+_FORMULA_ERROR_TOKENS = ('NA()', '#N/A', '#VALUE!', '#REF!')
+
+
+def _is_formula_error(formula_str) -> bool:
+    formula_str = str(formula_str).strip().upper()
+    return formula_str.startswith('=') and any(err in formula_str for err in _FORMULA_ERROR_TOKENS)
+
+
+def _clean_cell_value(val_found):
+    if is_na_value(val_found) or (isinstance(val_found, str) and not val_found.strip()):
+        return None
+    return val_found
+
+
+class _SheetReader(ABC):
+    """Interfaccia comune dei lettori di schede: valori per indice (riga, colonna) 0-based."""
+
+    @abstractmethod
+    def get_value(self, idx):
+        """Valore della cella all'indice (riga, colonna) 0-based, None se vuota."""
+
+    def get_values(self, layout: layouts.SheetLayout) -> dict:
+        """Legge in blocco tutti i campi di un layout, nel formato di raw_data."""
+        values = {name: self.get_value(idx) for name, idx in layout.field_indices.items()}
+        for name, slot in layout.slot_indices.items():
+            values[name] = [self.get_value(idx) for idx in slot]
+        return values
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _XlsxSinglePassReader(_SheetReader):
+    """Lettore .xlsx che apre il pacchetto una sola volta (XLSX_READER_MODE = "single_pass")."""
+
+    def __init__(self, file_path: str):
+        from .xlsx_reader import XlsxSheetReader
+        self._reader = XlsxSheetReader(file_path, cells=_indici_celle_richieste())
+
+    def get_value(self, idx):
+        r, c = idx[0] + 1, idx[1] + 1
+        formula_str = self._reader.formula(r, c)
+        if formula_str is not None and _is_formula_error(formula_str):
+            return "#FORMULA_ERROR#"
+        return _clean_cell_value(self._reader.value(r, c))
+
+    def close(self):
+        self._reader.close()
+
+
+class _OpenpyxlReader(_SheetReader):
+    """Lettore .xlsx storico: due caricamenti openpyxl, valori in cache e formule (XLSX_READER_MODE = "openpyxl")."""
+
+    def __init__(self, file_path: str):
+        from openpyxl import load_workbook
+        from .xlsx_reader import index_merged_cells
+        self._wb_values = load_workbook(filename=file_path, data_only=True, read_only=False)
+        self._wb_formulas = None
+        try:
+            self._ws_values = self._wb_values.active
+            self._wb_formulas = load_workbook(filename=file_path, data_only=False, read_only=False)
+            self._ws_formulas = self._wb_formulas.active
+            self._merged_index = index_merged_cells(
+                ((mr.min_row, mr.min_col, mr.max_row, mr.max_col) for mr in self._ws_values.merged_cells.ranges),
+                _indici_celle_richieste(),
+            )
+        except Exception:
+            self.close()
+            raise
+
+    def get_value(self, idx):
+        r, c = idx[0] + 1, idx[1] + 1
+        cell_formula = self._ws_formulas.cell(row=r, column=c)
+        if cell_formula.data_type == 'f' and _is_formula_error(cell_formula.value):
+            return "#FORMULA_ERROR#"
+
+        val_found = self._ws_values.cell(row=r, column=c).value
+        merged_bounds = self._merged_index.get((r, c))
+        if merged_bounds is not None:
+            val_found = self._ws_values.cell(row=merged_bounds[0], column=merged_bounds[1]).value
+        return _clean_cell_value(val_found)
+
+    def close(self):
+        if self._wb_values: self._wb_values.close()
+        if self._wb_formulas: self._wb_formulas.close()
+
+
+class _XlsReader(_SheetReader):
+    """Lettore .xls (xlrd) con risoluzione su richiesta delle celle unite."""
+
+    def __init__(self, file_path: str):
+        import xlrd
+        from .xlsx_reader import index_merged_cells
+        self._sheet = xlrd.open_workbook(file_path).sheet_by_index(0)
+        # Solo gli intervalli uniti che coprono celle richieste vengono indicizzati;
+        # il valore di ciascun intervallo viene risolto al primo accesso e memorizzato.
+        self._merged_index = index_merged_cells(
+            ((rlo + 1, clo + 1, rhi, chi) for rlo, rhi, clo, chi in self._sheet.merged_cells),
+            _indici_celle_richieste(),
+        )
+        self._merged_values = {}
+
+    def _resolve_merged_range(self, bounds):
+        min_row, min_col, max_row, max_col = bounds
+        for row_idx in range(min_row - 1, max_row):
+            for col_idx in range(min_col - 1, max_col):
+                cell_val = self._sheet.cell_value(row_idx, col_idx)
+                if cell_val is not None and str(cell_val).strip() != '':
+                    return cell_val
+        return None
+
+    def get_value(self, idx):
+        r, c = idx
+        merged_bounds = self._merged_index.get((r + 1, c + 1))
+        if merged_bounds is not None:
+            if merged_bounds not in self._merged_values:
+                self._merged_values[merged_bounds] = self._resolve_merged_range(merged_bounds)
+            val_found = self._merged_values[merged_bounds]
+        else:
+            val_found = self._sheet.cell_value(r, c)
+        return _clean_cell_value(val_found)
+
+
+def _open_sheet_reader(file_path: str) -> _SheetReader:
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == '.xlsx':
+        if config.XLSX_READER_MODE == "single_pass":
+            return _XlsxSinglePassReader(file_path)
+        return _OpenpyxlReader(file_path)
+    if file_ext == '.xls':
+        return _XlsReader(file_path)
+    raise ValueError(f"Formato file non supportato: {file_ext}")
+
+
 def read_instrument_sheet_raw_data(file_path: str) -> dict:
     base_filename = os.path.basename(file_path)
-    file_ext = os.path.splitext(base_filename)[1].lower()
     raw_data = {'file_path': file_path, 'base_filename': base_filename}
 
-    get_value = None
-    wb_values = None
-    wb_formulas = None
-
-    try:
-        if file_ext == '.xlsx':
-            wb_values = load_workbook(filename=file_path, data_only=True, read_only=False)
-            ws_values = wb_values.active
-            wb_formulas = load_workbook(filename=file_path, data_only=False, read_only=False)
-            ws_formulas = wb_formulas.active
-
-            def get_xlsx_value(coord_str):
-                cell_formula = ws_formulas[coord_str]
-                if cell_formula.data_type == 'f':
-                    formula_str = str(cell_formula.value).strip().upper()
-                    if formula_str.startswith('=') and any(err in formula_str for err in ['NA()', '#N/A', '#VALUE!', '#REF!']):
-                        return "#FORMULA_ERROR#"
-
-                cell_value = ws_values[coord_str]
-                val_found = cell_value.value
-
-                for merged_range in ws_values.merged_cells:
-                    if cell_value.coordinate in merged_range:
-                        top_left_cell = ws_values.cell(row=merged_range.min_row, column=merged_range.min_col)
-                        val_found = top_left_cell.value
-                        break
-
-                if pd.isna(val_found) or (isinstance(val_found, str) and not val_found.strip()):
-                    return None
-                return val_found
-            get_value = get_xlsx_value
-
-        elif file_ext == '.xls':
-            xls_workbook = xlrd.open_workbook(file_path)
-            xls_sheet = xls_workbook.sheet_by_index(0)
-
-            cell_to_merged_range_map = {}
-            for rlo, rhi, clo, chi in xls_sheet.merged_cells:
-                for r, c in product(range(rlo, rhi), range(clo, chi)):
-                    cell_to_merged_range_map[(r, c)] = (rlo, rhi, clo, chi)
-
-            def get_xls_value(coord_str):
-                r, c = excel_coord_to_indices(coord_str)
-                val_found = None
-                if (r, c) in cell_to_merged_range_map:
-                    rlo, rhi, clo, chi = cell_to_merged_range_map[(r, c)]
-                    for row_idx, col_idx in product(range(rlo, rhi), range(clo, chi)):
-                        cell_val = xls_sheet.cell_value(row_idx, col_idx)
-                        if cell_val is not None and str(cell_val).strip() != '':
-                            val_found = cell_val
-                            break
-                else:
-                    val_found = xls_sheet.cell_value(r, c)
-
-                if pd.isna(val_found) or (isinstance(val_found, str) and not val_found.strip()):
-                    return None
-                return val_found
-            get_value = get_xls_value
-        else:
-            raise ValueError(f"Formato file non supportato: {file_ext}")
-
-        model_indicator_e2 = get_value('E2')
-        model_indicator_e2_str = str(model_indicator_e2).strip().upper() if model_indicator_e2 else ""
-
-        if "STRUMENTI DIGITALI" in model_indicator_e2_str:
-            raw_data['file_type'] = "digitale"
-            raw_data['sp_code'] = get_value(config.SCHEDA_DIG_CELL_TIPOLOGIA_STRUM)
-            raw_data['range_um_processo'] = get_value(config.SCHEDA_DIG_CELL_RANGE_UM_PROCESSO)
-            raw_data['card_date'] = get_value(config.SCHEDA_DIG_CELL_DATA_COMPILAZIONE)
-            raw_data['odc'] = get_value(config.SCHEDA_DIG_CELL_ODC)
-            raw_data['pdl'] = get_value(config.SCHEDA_DIG_CELL_PDL)
-            raw_data['esecutore'] = get_value(config.SCHEDA_DIG_CELL_ESECUTORE)
-            raw_data['supervisore'] = get_value(config.SCHEDA_DIG_CELL_SUPERVISORE_ISAB)
-            raw_data['contratto'] = get_value(config.SCHEDA_DIG_CELL_CONTRATTO_COEMI)
-            raw_data['cert_ids'] = [get_value(c) for c in ["C18", "E18", "G18"]]
-            raw_data['cert_expiries'] = [get_value(c) for c in ["C19", "E19", "G19"]]
-            raw_data['cert_models'] = [get_value(c) for c in ["C13", "E13", "G13"]]
-            raw_data['cert_ranges'] = [get_value(c) for c in ["C16", "E16", "G16"]]
-
-        elif "STRUMENTI ANALOGICI" in model_indicator_e2_str:
-            raw_data['file_type'] = "analogico"
-            raw_data['sp_code'] = get_value(config.SCHEDA_ANA_CELL_TIPOLOGIA_STRUM)
-            raw_data['modello_l9'] = get_value(config.SCHEDA_ANA_CELL_MODELLO_STRUM)
-            raw_data['card_date'] = get_value(config.SCHEDA_ANA_CELL_DATA_COMPILAZIONE)
-            raw_data['range_ing'] = get_value(config.SCHEDA_ANA_CELL_RANGE_INGRESSO)
-            raw_data['um_ing'] = get_value(config.SCHEDA_ANA_CELL_UM_INGRESSO)
-            raw_data['range_usc'] = get_value(config.SCHEDA_ANA_CELL_RANGE_USCITA)
-            raw_data['um_usc'] = get_value(config.SCHEDA_ANA_CELL_UM_USCITA)
-            raw_data['range_dcs'] = get_value(config.SCHEDA_ANA_CELL_RANGE_DCS)
-            raw_data['um_dcs'] = get_value(config.SCHEDA_ANA_CELL_UM_DCS)
-            raw_data['odc'] = get_value(config.SCHEDA_ANA_CELL_ODC)
-            raw_data['pdl'] = get_value(config.SCHEDA_ANA_CELL_PDL)
-            raw_data['esecutore'] = get_value(config.SCHEDA_ANA_CELL_ESECUTORE)
-            raw_data['supervisore'] = get_value(config.SCHEDA_ANA_CELL_SUPERVISORE_ISAB)
-            raw_data['contratto'] = get_value(config.SCHEDA_ANA_CELL_CONTRATTO_COEMI)
-            raw_data['cert_ids'] = [get_value(c) for c in ["K43", "K44", "K45"]]
-            raw_data['cert_expiries'] = [get_value(c) for c in ["M43", "M44", "M45"]]
-            raw_data['cert_models'] = [get_value(c) for c in ["A43", "A44", "A45"]]
-            raw_data['cert_ranges'] = [get_value(c) for c in ["G43", "G44", "G45"]]
-
-    finally:
-        if wb_values: wb_values.close()
-        if wb_formulas: wb_formulas.close()
+    with _open_sheet_reader(file_path) as reader:
+        layout = layouts.detect_layout(reader.get_value(layouts.INDICE_TIPO_SCHEDA))
+        if layout is not None:
+            raw_data['file_type'] = layout.file_type
+            raw_data.update(reader.get_values(layout))
 
     return raw_data
 
 
 def save_configuration(new_config: Dict[str, str]) -> bool:
     try:
+        from openpyxl import load_workbook
         wb = load_workbook(config.PATH_FILE_PARAMETRI)
         ws = wb[config.NOME_FOGLIO_PARAMETRI]
 
@@ -282,6 +483,7 @@ def write_cell(file_path: str, cell_address: str, value) -> bool:
         return False
 
     try:
+        from openpyxl import load_workbook
         wb = load_workbook(file_path)
         ws = wb.active
 
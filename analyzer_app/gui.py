@@ -5,30 +5,24 @@ from functools import partial
 import logging
 import threading
 import queue
-import pyperclip # type: ignore
 import re
 import subprocess
 import sys
-import multiprocessing
 from collections import Counter, defaultdict
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from . import config
 from . import excel_io
 from . import analysis
-from . import reporting
+from . import engine
+from .cache import open_raw_data_cache, file_signature, load_registry, get_registry_snapshot, RegistrySnapshotWatcher
 from .data_models import InstrumentSheet, CertificateUsage, SheetError
+from .registry import RegistryIndex
+from .profiling import ProfiloRegole, riporta_profilo
 
 logger = logging.getLogger(__name__)
 
-def read_file_worker(q, file_path):
-    try:
-        raw_data = excel_io.read_instrument_sheet_raw_data(file_path)
-        q.put(('success', raw_data))
-    except Exception as e:
-        q.put(('error', e))
-
 class App:
     def __init__(self, root):
         self.root = root
@@ -47,13 +41,18 @@ class App:
         self.candidate_files_count = 0
         self.validated_file_count = 0
         self.strumenti_campione: List[config.CalibrationStandard] = []
+        self.registro = RegistryIndex([])
+        self.suggerimenti_utilizzi: Dict[int, List[config.CalibrationStandard]] = {}
+        self.usi_scaduti_count = self.usi_prima_emissione_count = 0
         self.cert_details_map = defaultdict(lambda: {
-            'id': "", 'utilizzi': 0, 'date_utilizzo_obj_set': set(),
+            'id': "", 'utilizzi': 0, 'date_utilizzo_counter': Counter(),
             'range_su_scheda_counter': Counter(), 'tipologie_scheda_associate_counter': Counter(),
             'usi_congrui': 0, 'usi_total_incongrui': 0, 'usi_prima_emissione': 0, 'usi_scaduti_puri': 0,
             'dettaglio_usi_list': []
         })
         self.last_clicked_item_id_for_toggle = [None]
+        self.last_run: Optional[engine.AnalysisRun] = None
+        self.registry_watcher: Optional[RegistrySnapshotWatcher] = None
 
         self._setup_styles()
         self.create_widgets()
@@ -81,6 +80,10 @@ class App:
         self.notebook.add(self.progress_tab, text=' Progresso Analisi ')
         self.start_button = ttk.Button(self.progress_tab, text="Avvia Analisi", command=self.start_analysis, style="Accent.TButton")
         self.start_button.pack(pady=10)
+        self.incremental_button = ttk.Button(self.progress_tab, text="Analisi Incrementale", command=partial(self.start_analysis, incremental=True), state=tk.DISABLED)
+        self.incremental_button.pack(pady=(0, 10))
+        self.simula_button = ttk.Button(self.progress_tab, text="Simula Regole", command=self._simula_regole, state=tk.DISABLED)
+        self.simula_button.pack(pady=(0, 10))
         log_frame = ttk.LabelFrame(self.progress_tab, text="Log di Analisi", padding=10)
         log_frame.pack(expand=True, fill=tk.BOTH)
         log_v_scroll = ttk.Scrollbar(log_frame); log_v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
@@ -118,56 +121,66 @@ class App:
         self.log_text.see(tk.END)
         logger.log(logging.getLevelName(level), message)
 
-    def start_analysis(self):
+    def start_analysis(self, incremental=False):
         self.start_button.config(state=tk.DISABLED)
+        self.incremental_button.config(state=tk.DISABLED)
+        self.simula_button.config(state=tk.DISABLED)
         for i in self.notebook.tabs():
             if self.notebook.index(i) > 0: self.notebook.tab(i, state=tk.DISABLED)
         self.notebook.select(self.progress_tab)
         self.log_text.config(state=tk.NORMAL); self.log_text.delete('1.0', tk.END); self.log_text.config(state=tk.DISABLED)
         self._log_message("Avvio del thread di analisi...")
         self.progress_bar['value'] = 0
-        self.analysis_thread = threading.Thread(target=self._analysis_worker, daemon=True)
+        previous_run = self.last_run if incremental else None
+        self.analysis_thread = threading.Thread(target=self._analysis_worker, args=(previous_run,), daemon=True)
         self.analysis_thread.start()
         self.root.after(100, self._check_analysis_queue)
 
-    def _analysis_worker(self):
+    def _analysis_worker(self, previous_run=None):
         try:
             config.load_config()
             self.analysis_queue.put(('log', "Configurazione ricaricata."))
             self.analysis_queue.put(('log', "Lettura registro strumenti..."))
-            self.strumenti_campione = excel_io.leggi_registro_strumenti() or []
+            self.strumenti_campione = load_registry() or []
+            self.registro = RegistryIndex(self.strumenti_campione)
             self.analysis_queue.put(('log', f"Letti {len(self.strumenti_campione)} strumenti validi dal registro."))
+            if config.USA_SNAPSHOT_REGISTRO and self.registry_watcher is None:
+                # Tiene aggiornato lo snapshot mentre l'applicazione è aperta: la prossima analisi non rilegge il registro.
+                self.registry_watcher = RegistrySnapshotWatcher(get_registry_snapshot(), config.INTERVALLO_CONTROLLO_REGISTRO_SEC)
+                self.registry_watcher.start()
             folder_path = config.FOLDER_PATH_DEFAULT
             if not folder_path or not os.path.isdir(folder_path): raise NotADirectoryError(f"Cartella schede non valida: {folder_path}")
             candidate_files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.xls', '.xlsx')) and not f.startswith('~')]
             self.candidate_files_count = len(candidate_files)
             self.analysis_queue.put(('log', f"Trovati {self.candidate_files_count} file candidati."))
             self.analysis_queue.put(('total_files', self.candidate_files_count))
-            results = []
-            for i, filename in enumerate(candidate_files):
-                file_path = os.path.join(folder_path, filename)
-                self.analysis_queue.put(('log', f"--- INIZIO elaborazione file {i+1}/{self.candidate_files_count}: {filename} ---"))
-                self.analysis_queue.put(('progress', (i + 1, f"Analisi di: {filename}")))
-                try:
-                    self.analysis_queue.put(('log', f"Fase 1: Lettura dati da {filename} (con timeout di 30s)"))
-                    q = multiprocessing.Queue()
-                    p = multiprocessing.Process(target=read_file_worker, args=(q, file_path))
-                    p.start(); p.join(30)
-                    if p.is_alive():
-                        p.terminate(); p.join()
-                        raise TimeoutError("La lettura del file ha superato i 30 secondi.")
-                    status, result = q.get()
-                    if status == 'error': raise result
-                    raw_data = result
-                    self.analysis_queue.put(('log', f"Fase 2: Analisi logica per {filename}"))
-                    sheet_result = analysis.analyze_sheet_data(raw_data, self.strumenti_campione)
-                    results.append(sheet_result)
-                    self.analysis_queue.put(('log', f"--- FINE elaborazione file: {sheet_result.status}"))
-                except Exception as e:
-                    logger.error(f"Errore durante l'analisi del file {filename}: {e}", exc_info=True)
-                    results.append(InstrumentSheet(file_path=file_path, base_filename=filename, status=f"Errore: {e}", is_valid=False))
-                    self.analysis_queue.put(('log', f"--- ERRORE elaborazione file: {filename} ---"))
-            self.analysis_queue.put(('done', results))
+            results_by_path = {}
+            file_paths = [os.path.join(folder_path, filename) for filename in candidate_files]
+            self.analysis_queue.put(('log', f"Analisi {'incrementale' if previous_run else 'in parallelo'} (timeout di {config.TIMEOUT_ELABORAZIONE_FILE_SEC}s per file)..."))
+            run = engine.AnalysisRun(self.strumenti_campione, list(config.VALIDATION_RULES))
+            profilo = ProfiloRegole() if config.PROFILA_REGOLE else None
+            raw_data_cache = open_raw_data_cache()
+            try:
+                for i, (file_path, sheet_result, error) in enumerate(engine.analyze_files(file_paths, self.registro, raw_data_cache, previous_run, run, profilo)):
+                    filename = os.path.basename(file_path)
+                    results_by_path[file_path] = sheet_result
+                    self.analysis_queue.put(('progress', (i + 1, f"Analisi di: {filename}")))
+                    esito = "ERRORE" if error else "FINE"
+                    self.analysis_queue.put(('log', f"--- {esito} elaborazione file {i+1}/{self.candidate_files_count}: {filename} - {sheet_result.status}"))
+            finally:
+                if raw_data_cache is not None:
+                    self.analysis_queue.put(('log', raw_data_cache.summary()))
+                    raw_data_cache.close()
+            results = [results_by_path[file_path] for file_path in file_paths]
+            if profilo is not None:
+                self.analysis_queue.put(('log', f"Profilo di controlli e regole scritto in {riporta_profilo(profilo)}"))
+            changes = None
+            if previous_run is not None:
+                self.analysis_queue.put(('log', run.summary()))
+                changes = [(previous_run.sheets.get(path), run.sheets.get(path))
+                           for path in dict.fromkeys([*previous_run.sheets, *run.sheets])
+                           if previous_run.sheets.get(path) is not run.sheets.get(path)]
+            self.analysis_queue.put(('done', (results, run, changes)))
         except Exception as e:
             logger.critical(f"Errore fatale nel thread di analisi: {e}", exc_info=True)
             self.analysis_queue.put(('error', e))
@@ -183,27 +196,84 @@ class App:
                     self.progress_bar['value'] = count
                     self.progress_label['text'] = message
                 elif msg_type == 'done':
-                    self.analysis_results = data
+                    self.analysis_results, self.last_run, changes = data
                     self.progress_label['text'] = "Analisi completata. Elaborazione risultati..."
-                    self._process_final_results()
+                    if changes is None: self._process_final_results()
+                    else: self._apply_results_delta(changes)
                     self._populate_results_ui()
                     self.start_button.config(state=tk.NORMAL)
+                    self.incremental_button.config(state=tk.NORMAL)
+                    self.simula_button.config(state=tk.NORMAL)
                     return
                 elif msg_type == 'error':
                     self.progress_label['text'] = f"Errore durante l'analisi: {data}"
                     messagebox.showerror("Errore di Analisi", f"Si è verificato un errore: {data}")
                     self.start_button.config(state=tk.NORMAL)
+                    if self.last_run is not None:
+                        self.incremental_button.config(state=tk.NORMAL)
+                        self.simula_button.config(state=tk.NORMAL)
                     return
         except queue.Empty: pass
         finally:
             if self.analysis_thread.is_alive(): self.root.after(100, self._check_analysis_queue)
 
+    def _simula_regole(self):
+        """Ricarica le regole da parametri.xlsm e ne mostra l'effetto sull'ultima analisi, senza rileggere le schede."""
+        run = self.last_run
+        if run is None: return
+        self.start_button.config(state=tk.DISABLED)
+        self.incremental_button.config(state=tk.DISABLED)
+        self.simula_button.config(state=tk.DISABLED)
+        self.notebook.select(self.progress_tab)
+
+        def worker():
+            try:
+                config.load_config()
+                errori_precedenti = {path: [e.key for e in sheet.human_errors] for path, sheet in run.sheets.items() if path in run.raw_data}
+                profilo = ProfiloRegole() if config.PROFILA_REGOLE else None
+                variazioni = engine.simula_regole(run.raw_data, self.registro, errori_precedenti, profilo)
+                self._log_message(engine.riepilogo_variazioni(variazioni, len(errori_precedenti)))
+                if profilo is not None:
+                    self._log_message(f"Profilo di controlli e regole scritto in {riporta_profilo(profilo)}")
+                self._log_message("Per applicare le regole usare 'Analisi Incrementale'.")
+            except Exception as e:
+                logger.error(f"Errore durante la simulazione delle regole: {e}", exc_info=True)
+                self._log_message(f"Simulazione regole non riuscita: {e}", "ERROR")
+            finally:
+                self.root.after(0, lambda: [b.config(state=tk.NORMAL) for b in (self.start_button, self.incremental_button, self.simula_button)])
+
+        self._log_message("Simulazione delle regole sull'ultima analisi...")
+        threading.Thread(target=worker, daemon=True).start()
+
     def _process_final_results(self):
         self.validated_file_count = sum(1 for res in self.analysis_results if res.is_valid)
-        self.all_cert_usages = [usage for res in self.analysis_results if res.is_valid for usage in res.certificate_usages]
+        self.all_cert_usages = analysis.utilizzi_conteggiati(self.analysis_results)
         self.human_errors_details = [{'file': res.base_filename, 'key': error.key, 'path': res.file_path} for res in self.analysis_results if res.human_errors for error in res.human_errors]
         self._log_message(f"Elaborazione completata. Schede validate: {self.validated_file_count}/{self.candidate_files_count}")
         self._update_cert_details_map()
+        self._compute_suggestions()
+
+    def _apply_results_delta(self, changes):
+        """Aggiorna contatori e cert_details_map solo per le schede cambiate: changes è una lista di (vecchia, nuova), None se assente."""
+        changed_paths = set()
+        for old, new in changes:
+            for res, sign in ((old, -1), (new, 1)):
+                if res is None: continue
+                changed_paths.add(res.file_path)
+                if res.is_valid:
+                    self.validated_file_count += sign
+                    for usage in res.certificate_usages: self._accumulate_cert_usage(usage, sign)
+        self.all_cert_usages = [u for u in self.all_cert_usages if u.file_path not in changed_paths]
+        self.all_cert_usages += analysis.utilizzi_conteggiati(new for _, new in changes)
+        self.human_errors_details = [d for d in self.human_errors_details if d['path'] not in changed_paths]
+        self.human_errors_details += [{'file': new.base_filename, 'key': error.key, 'path': new.file_path} for _, new in changes if new is not None for error in new.human_errors]
+        self._log_message(f"Elaborazione completata ({len(changes)} schede cambiate). Schede validate: {self.validated_file_count}/{self.candidate_files_count}")
+        self._compute_suggestions()
+
+    def _compute_suggestions(self):
+        """Verifica temporale complessiva e alternative per tutti gli utilizzi segnalati (tab Suggerimenti e report Word)."""
+        self.usi_scaduti_count, self.usi_prima_emissione_count = analysis.riepilogo_temporale(self.all_cert_usages)
+        self.suggerimenti_utilizzi = analysis.suggerisci_alternative(self.all_cert_usages, self.registro, config.NUM_ALTERNATIVE_SUGGERITE)
 
     def _populate_results_ui(self):
         for tab in [self.cruscotto_tab, self.cert_details_tab, self.correction_tab, self.suggerimenti_tab, self.autofill_tab, self.config_tab]:
@@ -223,6 +293,8 @@ class App:
         ttk.Label(stats_frame, text=f"File analizzati: {self.candidate_files_count}").pack(anchor=tk.W)
         ttk.Label(stats_frame, text=f"Schede validate: {self.validated_file_count}").pack(anchor=tk.W)
         ttk.Label(stats_frame, text=f"Utilizzi certificati totali: {len(self.all_cert_usages)}").pack(anchor=tk.W)
+        ttk.Label(stats_frame, text=f"Utilizzi con certificato scaduto: {self.usi_scaduti_count}").pack(anchor=tk.W)
+        ttk.Label(stats_frame, text=f"Utilizzi prima dell'emissione del certificato: {self.usi_prima_emissione_count}").pack(anchor=tk.W)
         ttk.Label(stats_frame, text=f"Errori di compilazione trovati: {len(self.human_errors_details)}").pack(anchor=tk.W)
         action_frame = ttk.LabelFrame(self.cruscotto_tab, text="Azioni", padding=10)
         action_frame.pack(fill=tk.X, pady=5, anchor='n')
@@ -363,7 +435,12 @@ class App:
         self.root.update_idletasks()
         try:
             raw_data = excel_io.read_instrument_sheet_raw_data(file_path)
-            new_result = analysis.analyze_sheet_data(raw_data, self.strumenti_campione)
+            new_result = analysis.analyze_sheet_data(raw_data, self.registro)
+            if self.last_run is not None:
+                # La prossima analisi incrementale deve confrontarsi con questo risultato.
+                self.last_run.sheets[file_path] = new_result
+                self.last_run.raw_data[file_path] = raw_data
+                self.last_run.signatures[file_path] = file_signature(file_path)
             index_to_replace = -1
             for i, res in enumerate(self.analysis_results):
                 if res.file_path == file_path:
@@ -394,8 +471,29 @@ class App:
         self.date_sugg_entry.insert(0, datetime.now().strftime('%d/%m/%Y'))
         self.date_sugg_entry.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
         ttk.Button(input_frame, text="Cerca Alternative", command=self._search_suggestions, style="Accent.TButton").grid(row=1, column=2, columnspan=2, padx=5, pady=5)
-        self.sugg_results_text = tk.Text(self.suggerimenti_tab, wrap=tk.WORD, state=tk.DISABLED, font=("Consolas", 10))
+        self.sugg_results_text = tk.Text(self.suggerimenti_tab, wrap=tk.WORD, state=tk.DISABLED, font=("Consolas", 10), height=10)
         self.sugg_results_text.pack(fill='both', expand=True, pady=5)
+        flagged_frame = ttk.LabelFrame(self.suggerimenti_tab, text="Alternative per gli utilizzi segnalati", padding=5)
+        flagged_frame.pack(fill='both', expand=True, pady=5)
+        flagged_text = tk.Text(flagged_frame, wrap=tk.WORD, font=("Consolas", 10))
+        vsb = ttk.Scrollbar(flagged_frame, orient="vertical", command=flagged_text.yview)
+        flagged_text.configure(yscrollcommand=vsb.set)
+        vsb.pack(side='right', fill='y'); flagged_text.pack(fill='both', expand=True)
+        flagged = sorted((u for u in self.all_cert_usages if id(u) in self.suggerimenti_utilizzi), key=lambda u: (u.file_name, u.certificate_id))
+        if not flagged: flagged_text.insert(tk.END, "Nessun utilizzo segnalato.")
+        for usage in flagged:
+            motivo = "usato prima dell'emissione" if usage.used_before_emission else "scaduto all'uso" if usage.is_expired_at_use else "non congruo"
+            data_str = usage.card_date.strftime('%d/%m/%Y') if usage.card_date else 'N/D'
+            flagged_text.insert(tk.END, f"{usage.file_name} ({data_str}) - Cert. {usage.certificate_id}, Range: {usage.instrument_range_on_card} - {motivo}\n")
+            alternative = self.suggerimenti_utilizzi[id(usage)]
+            if not alternative: flagged_text.insert(tk.END, "    Nessuna alternativa valida trovata.\n")
+            for res in alternative: flagged_text.insert(tk.END, f"    {self._format_alternativa(res)}\n")
+        flagged_text.config(state=tk.DISABLED)
+
+    @staticmethod
+    def _format_alternativa(res) -> str:
+        scad_str = res.scadenza.strftime('%d/%m/%Y') if res.scadenza else 'N/D'
+        return f"ID: {res.id_certificato}, Modello: {res.modello_strumento}, Range: {res.range}, Scadenza: {scad_str}"
 
     def _populate_config_tab(self):
         for widget in self.config_tab.winfo_children(): widget.destroy()
@@ -423,22 +521,33 @@ class App:
     def _update_cert_details_map(self):
         self.cert_details_map.clear()
         for usage in self.all_cert_usages:
-            details = self.cert_details_map[usage.certificate_id]
-            if not details['id']: details['id'] = usage.certificate_id
-            details['utilizzi'] += 1
-            details['dettaglio_usi_list'].append(usage)
-            if usage.card_date: details['date_utilizzo_obj_set'].add(usage.card_date)
-            if usage.instrument_range_on_card: details['range_su_scheda_counter'][usage.instrument_range_on_card] += 1
-            if usage.tipologia_strumento_scheda: details['tipologie_scheda_associate_counter'][usage.tipologia_strumento_scheda] += 1
-            if usage.is_congruent: details['usi_congrui'] += 1
-            elif usage.is_congruent is False: details['usi_total_incongrui'] += 1
-            if usage.used_before_emission: details['usi_prima_emissione'] += 1
-            elif usage.is_expired_at_use: details['usi_scaduti_puri'] += 1
+            self._accumulate_cert_usage(usage)
+
+    def _accumulate_cert_usage(self, usage: CertificateUsage, sign: int = 1):
+        """Aggiunge (sign=1) o toglie (sign=-1) un utilizzo dai contatori di cert_details_map."""
+        details = self.cert_details_map[usage.certificate_id]
+        if not details['id']: details['id'] = usage.certificate_id
+        details['utilizzi'] += sign
+        if sign > 0: details['dettaglio_usi_list'].append(usage)
+        else: details['dettaglio_usi_list'].remove(usage)
+        if usage.card_date: details['date_utilizzo_counter'][usage.card_date] += sign
+        if usage.instrument_range_on_card: details['range_su_scheda_counter'][usage.instrument_range_on_card] += sign
+        if usage.tipologia_strumento_scheda: details['tipologie_scheda_associate_counter'][usage.tipologia_strumento_scheda] += sign
+        if usage.is_congruent: details['usi_congrui'] += sign
+        elif usage.is_congruent is False: details['usi_total_incongrui'] += sign
+        if usage.used_before_emission: details['usi_prima_emissione'] += sign
+        elif usage.is_expired_at_use: details['usi_scaduti_puri'] += sign
+        if sign < 0:
+            if details['utilizzi'] <= 0:
+                del self.cert_details_map[usage.certificate_id]
+                return
+            for counter in (details['date_utilizzo_counter'], details['range_su_scheda_counter'], details['tipologie_scheda_associate_counter']):
+                for key in [k for k, n in counter.items() if n <= 0]: del counter[key]
 
     def _prepare_data_for_treeview(self) -> List[Dict]:
         tree_data = []
         for cert_id, details in self.cert_details_map.items():
-            scad_rec = max(details['date_utilizzo_obj_set']).strftime('%d/%m/%Y') if details['date_utilizzo_obj_set'] else "N/D"
+            scad_rec = max(details['date_utilizzo_counter']).strftime('%d/%m/%Y') if details['date_utilizzo_counter'] else "N/D"
             range_p = details['range_su_scheda_counter'].most_common(1)[0][0] if details['range_su_scheda_counter'] else "N/D"
             tip_p = details['tipologie_scheda_associate_counter'].most_common(1)[0][0] if details['tipologie_scheda_associate_counter'] else "N/D"
             tree_data.append({ "ID Certificato": cert_id, "Utilizzi": details.get('utilizzi', 0), "Tipologia Principale": tip_p, "Congrui": details.get('usi_congrui', 0), "Non Congrui": details.get('usi_total_incongrui', 0), "Prima Emiss.": details.get('usi_prima_emissione', 0), "Scaduti": details.get('usi_scaduti_puri', 0), "Scadenza Recente": scad_rec, "Range Principale": range_p })
@@ -482,7 +591,7 @@ class App:
         date_ref_str = self.date_sugg_entry.get().strip()
         date_ref = excel_io.parse_date_robust(date_ref_str)
         if not date_ref: messagebox.showerror("Errore Data", "Formato data non valido. Usare gg/mm/aaaa.", parent=self.root); return
-        results = analysis.trova_strumenti_alternativi(range_req, date_ref, self.strumenti_campione)
+        results = analysis.alternative_in_cache(range_req, date_ref, self.registro)
         self.sugg_results_text.config(state=tk.NORMAL)
         self.sugg_results_text.delete("1.0", tk.END)
         if not results: self.sugg_results_text.insert(tk.END, "Nessuna alternativa valida trovata.")
@@ -491,8 +600,7 @@ class App:
             for res in results:
                 if res.id_certificato == cert_id_target: continue
                 count += 1
-                scad_str = res.scadenza.strftime('%d/%m/%Y') if res.scadenza else 'N/D'
-                self.sugg_results_text.insert(tk.END, f"ID: {res.id_certificato}, Modello: {res.modello_strumento}, Range: {res.range}, Scadenza: {scad_str}\n")
+                self.sugg_results_text.insert(tk.END, f"{self._format_alternativa(res)}\n")
             if count == 0: self.sugg_results_text.insert(tk.END, "Nessuna alternativa valida trovata (escludendo il certificato di partenza).")
         self.sugg_results_text.config(state=tk.DISABLED)
 
@@ -502,15 +610,18 @@ class App:
         for usage in self.all_cert_usages:
             item = usage.__dict__.copy()
             item['card_date_str'] = usage.card_date.strftime('%d/%m/%Y') if usage.card_date else 'N/D'
+            item['alternative_suggerite'] = [self._format_alternativa(res) for res in self.suggerimenti_utilizzi.get(id(usage), [])]
             if usage.used_before_emission: item['alert_type'] = 'premature_emission'; temporal_list.append(item)
             elif usage.is_expired_at_use: item['alert_type'] = 'expired_at_use'; temporal_list.append(item)
             if usage.is_congruent is False and not usage.used_before_emission: incongruent_list.append(item)
+        from . import reporting  # python-docx viene caricato solo alla stampa del report
         file_path = reporting.crea_e_apri_report_anomalie_word(self.human_errors_details, temporal_list, incongruent_list, self.candidate_files_count, self.validated_file_count)
         if file_path: messagebox.showinfo("Report Generato", f"Report Word generato e aperto:\n{file_path}", parent=self.root)
         else: messagebox.showwarning("Report non Generato", "Nessuna anomalia significativa trovata o si è verificato un errore.", parent=self.root)
 
     def _on_file_click(self, file_path, filename, open_file_direct=False):
         try:
+            import pyperclip # type: ignore
             pyperclip.copy(file_path)
             action_text = "Aprire il file?" if open_file_direct else f"Aprire la cartella del file '{filename}'?"
             if messagebox.askyesno("Percorso Copiato", f"Percorso copiato negli appunti:\n{file_path}\n\n{action_text}", parent=self.root):
@@ -554,6 +665,7 @@ class App:
             self._log_message(msg, "ERROR")
             messagebox.showerror("Errore File Compilazione", f"{msg}\nControllare parametri.xlsm (B4).", parent=self.root)
             return
+        import pandas as pd
         try:
             df_sorgente = pd.read_excel(config.FILE_DATI_COMPILAZIONE_SCHEDE, sheet_name=config.NOME_FOGLIO_DATI_COMPILAZIONE, engine='openpyxl', header=0)
             self._log_message(f"Letti {len(df_sorgente)} righe dal file dati compilazione.", "INFO")
@@ -577,5 +689,6 @@ class App:
 
     def _on_close(self):
         if messagebox.askokcancel("Chiudi", "Vuoi davvero chiudere l'applicazione?"):
+            if self.registry_watcher is not None: self.registry_watcher.stop()
             self.root.destroy()
             logger.info("Applicazione chiusa dall'utente.")
\ No newline at end of file
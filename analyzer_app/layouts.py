@@ -0,0 +1,121 @@
+# analyzer_app/layouts.py
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import config
+
+# Cella che identifica il tipo di scheda.
+CELLA_TIPO_SCHEDA = "E2"
+
+
+def coord_to_indices(coord_str: str) -> Tuple[int, int]:
+    """Converte una coordinata Excel (es. "B3") in indici 0-based (riga, colonna), senza regex."""
+    coord = coord_str.strip().upper()
+    col_idx = 0
+    pos = 0
+    while pos < len(coord) and "A" <= coord[pos] <= "Z":
+        col_idx = col_idx * 26 + (ord(coord[pos]) - ord("A") + 1)
+        pos += 1
+    if pos == 0 or pos == len(coord) or not coord[pos:].isdigit():
+        raise ValueError(f"Coordinata Excel non valida: {coord_str}")
+    return int(coord[pos:]) - 1, col_idx - 1
+
+
+@dataclass(frozen=True)
+class SheetLayout:
+    """
+    Layout di un modello di scheda: quali celle leggere e con quale nome di campo.
+
+    `fields` associa ogni campo di raw_data a una coordinata; `slot_fields` associa
+    i campi a lista (es. i tre slot certificato) alle rispettive coordinate. Gli indici
+    (riga, colonna) 0-based vengono calcolati una volta alla creazione del layout.
+    """
+    file_type: str
+    marker_e2: str
+    fields: Dict[str, str]
+    slot_fields: Dict[str, Sequence[str]] = field(default_factory=dict)
+    field_indices: Dict[str, Tuple[int, int]] = field(init=False, repr=False)
+    slot_indices: Dict[str, Tuple[Tuple[int, int], ...]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "field_indices", {name: coord_to_indices(coord) for name, coord in self.fields.items()})
+        object.__setattr__(self, "slot_indices", {name: tuple(coord_to_indices(c) for c in coords) for name, coords in self.slot_fields.items()})
+
+    def cell_indices(self) -> List[Tuple[int, int]]:
+        """Tutte le celle (0-based) lette da questo layout."""
+        return list(self.field_indices.values()) + [idx for slot in self.slot_indices.values() for idx in slot]
+
+    def matches(self, e2_value) -> bool:
+        return bool(e2_value) and self.marker_e2 in str(e2_value).strip().upper()
+
+
+LAYOUT_REGISTRY: Dict[str, SheetLayout] = {}
+INDICE_TIPO_SCHEDA = coord_to_indices(CELLA_TIPO_SCHEDA)
+# Unione delle celle di tutti i layout registrati (0-based), E2 compresa.
+INDICI_CELLE_RICHIESTE: List[Tuple[int, int]] = [INDICE_TIPO_SCHEDA]
+
+
+def register_layout(layout: SheetLayout) -> SheetLayout:
+    """Registra un layout; le sue celle entrano nell'insieme letto da ogni scheda."""
+    LAYOUT_REGISTRY[layout.file_type] = layout
+    for idx in layout.cell_indices():
+        if idx not in INDICI_CELLE_RICHIESTE:
+            INDICI_CELLE_RICHIESTE.append(idx)
+    return layout
+
+
+def detect_layout(e2_value) -> Optional[SheetLayout]:
+    """Restituisce il layout il cui marcatore compare nel valore di E2, nell'ordine di registrazione."""
+    for layout in LAYOUT_REGISTRY.values():
+        if layout.matches(e2_value):
+            return layout
+    return None
+
+
+LAYOUT_DIGITALE = register_layout(SheetLayout(
+    file_type="digitale",
+    marker_e2="STRUMENTI DIGITALI",
+    fields={
+        'sp_code': config.SCHEDA_DIG_CELL_TIPOLOGIA_STRUM,
+        'range_um_processo': config.SCHEDA_DIG_CELL_RANGE_UM_PROCESSO,
+        'card_date': config.SCHEDA_DIG_CELL_DATA_COMPILAZIONE,
+        'odc': config.SCHEDA_DIG_CELL_ODC,
+        'pdl': config.SCHEDA_DIG_CELL_PDL,
+        'esecutore': config.SCHEDA_DIG_CELL_ESECUTORE,
+        'supervisore': config.SCHEDA_DIG_CELL_SUPERVISORE_ISAB,
+        'contratto': config.SCHEDA_DIG_CELL_CONTRATTO_COEMI,
+    },
+    slot_fields={
+        'cert_ids': ("C18", "E18", "G18"),
+        'cert_expiries': ("C19", "E19", "G19"),
+        'cert_models': ("C13", "E13", "G13"),
+        'cert_ranges': ("C16", "E16", "G16"),
+    },
+))
+
+LAYOUT_ANALOGICO = register_layout(SheetLayout(
+    file_type="analogico",
+    marker_e2="STRUMENTI ANALOGICI",
+    fields={
+        'sp_code': config.SCHEDA_ANA_CELL_TIPOLOGIA_STRUM,
+        'modello_l9': config.SCHEDA_ANA_CELL_MODELLO_STRUM,
+        'card_date': config.SCHEDA_ANA_CELL_DATA_COMPILAZIONE,
+        'range_ing': config.SCHEDA_ANA_CELL_RANGE_INGRESSO,
+        'um_ing': config.SCHEDA_ANA_CELL_UM_INGRESSO,
+        'range_usc': config.SCHEDA_ANA_CELL_RANGE_USCITA,
+        'um_usc': config.SCHEDA_ANA_CELL_UM_USCITA,
+        'range_dcs': config.SCHEDA_ANA_CELL_RANGE_DCS,
+        'um_dcs': config.SCHEDA_ANA_CELL_UM_DCS,
+        'odc': config.SCHEDA_ANA_CELL_ODC,
+        'pdl': config.SCHEDA_ANA_CELL_PDL,
+        'esecutore': config.SCHEDA_ANA_CELL_ESECUTORE,
+        'supervisore': config.SCHEDA_ANA_CELL_SUPERVISORE_ISAB,
+        'contratto': config.SCHEDA_ANA_CELL_CONTRATTO_COEMI,
+    },
+    slot_fields={
+        'cert_ids': ("K43", "K44", "K45"),
+        'cert_expiries': ("M43", "M44", "M45"),
+        'cert_models': ("A43", "A44", "A45"),
+        'cert_ranges': ("G43", "G44", "G45"),
+    },
+))
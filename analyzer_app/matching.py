@@ -0,0 +1,49 @@
+# analyzer_app/matching.py
+"""Ricerca di più chiavi testuali in una sola scansione (automa di Aho-Corasick)."""
+from collections import deque
+from typing import Dict, List, Sequence
+
+
+class AhoCorasick:
+    """
+    Automa costruito una volta su un elenco di chiavi: find_all() restituisce gli indici
+    (nell'elenco originale) di tutte le chiavi contenute nel testo, in tempo lineare
+    nella lunghezza del testo indipendentemente dal numero di chiavi.
+    """
+
+    def __init__(self, keys: Sequence[str]):
+        self.keys = list(keys)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, key in enumerate(self.keys):
+            state = 0
+            for char in key:
+                if char not in self._goto[state]:
+                    self._goto.append({}); self._fail.append(0); self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(index)
+
+        # Collegamenti di fallimento in ampiezza: ogni stato eredita le uscite del suo suffisso più lungo.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[int]:
+        """Indici delle chiavi contenute in `text`, in ordine crescente e senza ripetizioni."""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            found.update(self._out[state])
+        return sorted(found)
@@ -0,0 +1,68 @@
+# analyzer_app/normalization.py
+"""
+Normalizzazione di codice SP, unità di misura e range: espressioni precompilate e risultati
+memorizzati per valore grezzo. In un'analisi i valori distinti sono pochi (le stesse UM e gli
+stessi range ricorrono su migliaia di schede), quindi quasi ogni chiamata è una ricerca in cache.
+"""
+import re
+from functools import lru_cache, wraps
+
+from . import config
+from .excel_io import is_na_value
+
+_SP_CODE = re.compile(r'\s*SP\s*(\d+)\s*/\s*(\d+)')
+_RANGE_SEPARATORE = re.compile(r'\s*[\/÷]\s*')
+_RANGE_TO = re.compile(r'\s*to\s*', re.IGNORECASE)
+_RANGE_TRATTINO = re.compile(r'\s*-\s*')
+_SPAZI = re.compile(r'\s+')
+# Tutte le chiavi della mappa UM in un'unica espressione: una sola scansione dice se c'è qualcosa da sostituire.
+_UM_MAPPA = re.compile("|".join(re.escape(k) for k in config.MAPPA_NORMALIZZAZIONE_UM))
+
+
+def _memoizzata(funzione):
+    """lru_cache limitata per valore grezzo e tipo (1 e 1.0 non si normalizzano allo stesso modo); i valori non hashable non vengono memorizzati."""
+    in_cache = lru_cache(maxsize=config.DIMENSIONE_CACHE_NORMALIZZAZIONE, typed=True)(funzione)
+
+    @wraps(funzione)
+    def normalizza(valore):
+        try:
+            hash(valore)
+        except TypeError:
+            return funzione(valore)
+        return in_cache(valore)
+
+    normalizza.cache_info = in_cache.cache_info
+    normalizza.cache_clear = in_cache.cache_clear
+    return normalizza
+
+
+@_memoizzata
+def normalize_sp_code(sp_code_raw) -> str:
+    if is_na_value(sp_code_raw): return ""
+    s_norm = str(sp_code_raw).strip().upper().replace("S.P.", "SP").replace(".", "").replace("-", "/")
+    s_norm = " ".join(s_norm.split())
+    return _SP_CODE.sub(r'SP \1/\2', s_norm)
+
+
+@_memoizzata
+def normalize_um(um_str_raw) -> str:
+    if is_na_value(um_str_raw): return ""
+    s_norm = " ".join(str(um_str_raw).strip().lower().split())
+    if _UM_MAPPA.search(s_norm):
+        # Sostituzioni in sequenza nell'ordine della mappa, come sempre: una sostituzione può formare
+        # un'altra chiave (es. "milli ampere" + "mp" -> "mamp"), che una sostituzione in un solo passaggio ignorerebbe.
+        for k, v in config.MAPPA_NORMALIZZAZIONE_UM.items(): s_norm = s_norm.replace(k, v)
+    return s_norm.replace(" ", "")
+
+
+@_memoizzata
+def normalize_range_string(range_str_raw) -> str:
+    if is_na_value(range_str_raw): return ""
+    if isinstance(range_str_raw, (int, float)):
+        range_str_raw = str(int(range_str_raw)) if range_str_raw == int(range_str_raw) else str(range_str_raw)
+    norm_str = " ".join(str(range_str_raw).lower().split())
+    norm_str = _RANGE_SEPARATORE.sub('-', norm_str)
+    norm_str = _RANGE_TO.sub('-', norm_str)
+    norm_str = _RANGE_TRATTINO.sub('-', norm_str)
+    return _SPAZI.sub('', norm_str)
+
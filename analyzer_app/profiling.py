@@ -0,0 +1,95 @@
+# analyzer_app/profiling.py
+"""Profilo dei controlli fissi e delle regole di validazione: valutazioni, segnalazioni e tempo cumulativo."""
+import os
+import csv
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+TIPO_CONTROLLO = "controllo"
+TIPO_REGOLA = "regola"
+
+
+class ProfiloRegole:
+    """
+    Statistiche per (tipo, nome): i controlli fissi di analyze_sheet_data per nome, le regole di
+    RegoleValidazione per ChiaveErrore (più regole con la stessa chiave vengono sommate).
+    Ogni processo di analisi ne produce uno per scheda; il processo principale li unisce.
+    """
+
+    def __init__(self):
+        # (tipo, nome) -> [valutazioni, segnalazioni, secondi]
+        self.statistiche: Dict[Tuple[str, str], List] = {}
+
+    def registra(self, tipo: str, nome: str, hit: bool, secondi: float):
+        voce = self.statistiche.get((tipo, nome))
+        if voce is None:
+            voce = self.statistiche[(tipo, nome)] = [0, 0, 0.0]
+        voce[0] += 1
+        voce[1] += bool(hit)
+        voce[2] += secondi
+
+    @contextmanager
+    def misura(self, nome: str, errori: list):
+        """Misura un controllo fisso: segnala se durante il blocco sono stati aggiunti errori alla lista."""
+        prima = len(errori)
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registra(TIPO_CONTROLLO, nome, len(errori) > prima, time.perf_counter() - inizio)
+
+    def unisci(self, altro: "ProfiloRegole"):
+        for chiave, (valutazioni, hit, secondi) in altro.statistiche.items():
+            voce = self.statistiche.setdefault(chiave, [0, 0, 0.0])
+            voce[0] += valutazioni
+            voce[1] += hit
+            voce[2] += secondi
+
+    def includi_regole(self, rules: List[dict]):
+        """Aggiunge a zero le regole mai valutate, così compaiono nel profilo come candidate alla rimozione."""
+        for rule in rules:
+            self.statistiche.setdefault((TIPO_REGOLA, rule['ChiaveErrore']), [0, 0, 0.0])
+
+    def righe(self) -> List[Tuple[str, str, int, int, float]]:
+        """(tipo, nome, valutazioni, segnalazioni, secondi) per tempo cumulativo decrescente."""
+        return sorted(((tipo, nome, *voce) for (tipo, nome), voce in self.statistiche.items()), key=lambda r: (-r[4], r[0], r[1]))
+
+    def tabella(self) -> str:
+        lines = [f"{'tempo ms':>10} | {'valutaz.':>8} | {'hit':>6} | {'µs/val.':>8} | voce"]
+        for tipo, nome, valutazioni, hit, secondi in self.righe():
+            medio = secondi / valutazioni * 1e6 if valutazioni else 0.0
+            lines.append(f"{secondi * 1000:10.1f} | {valutazioni:8d} | {hit:6d} | {medio:8.1f} | {tipo} {nome}")
+        return "\n".join(lines)
+
+    def scrivi_csv(self, csv_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["tipo", "nome", "valutazioni", "hit", "tempo_ms", "tempo_medio_us"])
+            for tipo, nome, valutazioni, hit, secondi in self.righe():
+                medio = secondi / valutazioni * 1e6 if valutazioni else 0.0
+                writer.writerow([tipo, nome, valutazioni, hit, f"{secondi * 1000:.3f}", f"{medio:.2f}"])
+
+    def __bool__(self) -> bool:
+        return bool(self.statistiche)
+
+
+def riporta_profilo(profilo: ProfiloRegole, csv_path: Optional[str] = None) -> str:
+    """Scrive la tabella nel log e il CSV (di default nella cartella dei log); restituisce il percorso del CSV."""
+    profilo.includi_regole(config.VALIDATION_RULES)
+    if csv_path is None:
+        timestamp_str = config.ANALYSIS_DATETIME.astimezone().strftime("%Y%m%d_%H%M%S")
+        csv_path = os.path.join(config.LOGS_DIR, config.PROFILO_REGOLE_FILENAME_TEMPLATE.format(timestamp=timestamp_str))
+    logger.info(f"Profilo di controlli e regole di validazione:\n{profilo.tabella()}")
+    try:
+        profilo.scrivi_csv(csv_path)
+        logger.info(f"Profilo delle regole scritto in {csv_path}")
+    except OSError as e:
+        logger.error(f"Impossibile scrivere il profilo delle regole in {csv_path}: {e}")
+    return csv_path
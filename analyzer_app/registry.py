@@ -0,0 +1,193 @@
+# analyzer_app/registry.py
+"""Indici sul registro degli strumenti campione, costruiti una volta dopo la lettura del registro."""
+import re
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import config
+from .data_models import CalibrationStandard
+
+_SPAZI = re.compile(r"\s+")
+
+
+def normalizza_id_certificato(cert_id) -> str:
+    """ID certificato in forma confrontabile: senza spazi ai bordi, spazi interni singoli, maiuscolo."""
+    return _SPAZI.sub(" ", str(cert_id).strip()).upper()
+
+
+def normalizza_modello(modello) -> str:
+    return str(modello).strip().upper()
+
+
+def data_naive(dt: datetime) -> datetime:
+    """Data senza fuso orario (convertita in UTC se ne ha uno), per confronti omogenei con il registro."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo is not None else dt
+
+
+class _GruppoRange:
+    """Campioni con lo stesso range normalizzato, ordinati per scadenza (a parità, ordine del registro inverso)."""
+
+    def __init__(self, voci: List[Tuple[datetime, int, datetime, CalibrationStandard]]):
+        voci.sort(key=lambda v: (v[0], -v[1]))
+        self.scadenze = [v[0] for v in voci]
+        self.emissioni = [v[2] for v in voci]
+        self.strumenti = [v[3] for v in voci]
+        # Durata massima di validità: oltre data + durata nessuna scadenza può avere emissione <= data.
+        self.durata_max = max(sc - em for sc, _, em, _ in voci)
+
+    def validi(self, data: datetime) -> List[CalibrationStandard]:
+        """Campioni con emissione <= data < scadenza, per scadenza decrescente."""
+        inizio = bisect_right(self.scadenze, data)
+        try:
+            fine = bisect_right(self.scadenze, data + self.durata_max)
+        except (OverflowError, ValueError):
+            # Oltre il limite delle date: ValueError comprende OutOfBoundsDatetime di pandas (Timestamp/Timedelta).
+            fine = len(self.scadenze)
+        return [self.strumenti[i] for i in range(fine - 1, inizio - 1, -1) if self.emissioni[i] <= data]
+
+
+class _IndiceCopertura:
+    """
+    Range numerici distinti di una stessa UM, ordinati per estremo inferiore, ciascuno con il proprio _GruppoRange.
+    Un albero dei massimi sugli estremi superiori (segment tree) scarta interi blocchi di range che non arrivano
+    al massimo richiesto: una ricerca costa O((k + 1) log n) per k range trovati invece di O(n).
+    """
+
+    def __init__(self, gruppi: Dict[Tuple[float, float], _GruppoRange]):
+        self.ranges = sorted(gruppi)
+        self.minimi = [r[0] for r in self.ranges]
+        self.gruppi = [gruppi[r] for r in self.ranges]
+        self._foglie = 1
+        while self._foglie < len(self.ranges):
+            self._foglie *= 2
+        # Nodo i: massimo degli estremi superiori dei figli 2i e 2i+1; le foglie partono da self._foglie.
+        self._massimi = [float("-inf")] * (2 * self._foglie)
+        for i, (_, r_max) in enumerate(self.ranges):
+            self._massimi[self._foglie + i] = r_max
+        for nodo in range(self._foglie - 1, 0, -1):
+            self._massimi[nodo] = max(self._massimi[2 * nodo], self._massimi[2 * nodo + 1])
+
+    def coprenti(self, minimo: float, massimo: float) -> Iterator[Tuple[Tuple[float, float], _GruppoRange]]:
+        """Range con minimo <= `minimo` e massimo >= `massimo`, per estremo inferiore crescente."""
+        limite = bisect_right(self.minimi, minimo)
+        pila = [(1, 0, self._foglie)]  # (nodo, primo range coperto, range successivo all'ultimo)
+        while pila:
+            nodo, inizio, fine = pila.pop()
+            if inizio >= limite or self._massimi[nodo] < massimo:
+                continue
+            if nodo >= self._foglie:
+                yield self.ranges[inizio], self.gruppi[inizio]
+                continue
+            meta = (inizio + fine) // 2
+            pila.append((2 * nodo + 1, meta, fine))
+            pila.append((2 * nodo, inizio, meta))
+
+
+class RegistryIndex:
+    """
+    Registro campioni indicizzato per ID certificato e per modello (accesso O(1)).
+
+    Lo stesso ID può comparire più volte (certificato riemesso): l'indice conserva tutte le
+    righe nell'ordine del registro e trova() restituisce la prima, come la vecchia ricerca
+    lineare, preferendo quella con l'ID scritto esattamente come richiesto.
+    """
+
+    def __init__(self, strumenti_campione: List[CalibrationStandard]):
+        self.strumenti = list(strumenti_campione)
+        self._per_id: Dict[str, List[CalibrationStandard]] = defaultdict(list)
+        self._per_modello: Dict[str, List[CalibrationStandard]] = defaultdict(list)
+        for strumento in self.strumenti:
+            self._per_id[normalizza_id_certificato(strumento.id_certificato)].append(strumento)
+            self._per_modello[normalizza_modello(strumento.modello_strumento)].append(strumento)
+        self._per_id = dict(self._per_id)
+        self._per_modello = dict(self._per_modello)
+        self._per_range: Optional[Dict[str, _GruppoRange]] = None
+        self._per_um: Dict[str, _IndiceCopertura] = {}
+        # Alternative già calcolate per (range richiesto, data di riferimento), vedi analysis.alternative_in_cache:
+        # limitate alle più recenti, e azzerate con il registro quando viene ricaricato.
+        self.cache_alternative = lru_cache(maxsize=config.DIMENSIONE_CACHE_ALTERNATIVE)(self._cerca_alternative)
+
+    def __getstate__(self):
+        # Il registro viene passato ai processi del pool: la cache (una funzione) non è serializzabile e viene ricreata vuota.
+        stato = self.__dict__.copy()
+        del stato['cache_alternative']
+        return stato
+
+    def __setstate__(self, stato):
+        self.__dict__.update(stato)
+        self.cache_alternative = lru_cache(maxsize=config.DIMENSIONE_CACHE_ALTERNATIVE)(self._cerca_alternative)
+
+    def _cerca_alternative(self, range_richiesto: str, data_riferimento: Optional[datetime]) -> List[CalibrationStandard]:
+        from .analysis import trova_strumenti_alternativi
+        return trova_strumenti_alternativi(range_richiesto, data_riferimento, self)
+
+    def trova(self, cert_id) -> Optional[CalibrationStandard]:
+        """Strumento campione con l'ID certificato indicato, None se assente."""
+        candidati = self._per_id.get(normalizza_id_certificato(cert_id))
+        if not candidati:
+            return None
+        cert_id = str(cert_id).strip()
+        return next((sc for sc in candidati if sc.id_certificato == cert_id), candidati[0])
+
+    def certificati(self, cert_id) -> List[CalibrationStandard]:
+        """Tutte le righe del registro con l'ID certificato indicato (più di una se riemesso)."""
+        return list(self._per_id.get(normalizza_id_certificato(cert_id), ()))
+
+    def per_modello(self, modello) -> List[CalibrationStandard]:
+        """Strumenti campione del modello indicato, nell'ordine del registro."""
+        return list(self._per_modello.get(normalizza_modello(modello), ()))
+
+    def _indice_range(self) -> Dict[str, _GruppoRange]:
+        # Costruiti alla prima ricerca di alternative (l'analisi delle schede non li usa): range
+        # normalizzati e range numerici vengono calcolati una sola volta per registro.
+        if self._per_range is None:
+            from .analysis import parse_range_numerico
+            from .normalization import normalize_range_string
+            voci: Dict[str, list] = defaultdict(list)
+            voci_numeriche: Dict[str, Dict[Tuple[float, float], list]] = defaultdict(lambda: defaultdict(list))
+            for pos, strumento in enumerate(self.strumenti):
+                if strumento.scadenza and strumento.data_emissione:
+                    voce = (data_naive(strumento.scadenza), pos, data_naive(strumento.data_emissione), strumento)
+                    voci[normalize_range_string(strumento.range or "")].append(voce)
+                    range_numerico = parse_range_numerico(strumento.range)
+                    if range_numerico is not None:
+                        minimo, massimo, um = range_numerico
+                        voci_numeriche[um][(minimo, massimo)].append(voce)
+            self._per_range = {range_norm: _GruppoRange(gruppo) for range_norm, gruppo in voci.items()}
+            self._per_um = {um: _IndiceCopertura({r: _GruppoRange(gruppo) for r, gruppo in gruppi.items()})
+                            for um, gruppi in voci_numeriche.items()}
+        return self._per_range
+
+    def alternative(self, range_norm: str, data_riferimento: datetime) -> List[CalibrationStandard]:
+        """
+        Campioni con range normalizzato `range_norm` validi alla data (naive) indicata, dalla
+        scadenza più lontana: una ricerca nel dizionario e una ricerca binaria sulle scadenze.
+        """
+        gruppo = self._indice_range().get(range_norm)
+        return gruppo.validi(data_riferimento) if gruppo is not None else []
+
+    def copertura(self, minimo: float, massimo: float, um: str, data_riferimento: datetime) -> List[CalibrationStandard]:
+        """
+        Campioni con la stessa UM il cui range contiene [minimo, massimo], validi alla data (naive)
+        indicata: prima il range più aderente (minore ampiezza in eccesso), poi la scadenza più lontana.
+        """
+        self._indice_range()
+        indice = self._per_um.get(um)
+        if indice is None:
+            return []
+        trovati = []
+        for (r_min, r_max), gruppo in indice.coprenti(minimo, massimo):
+            validi = gruppo.validi(data_riferimento)
+            if validi:
+                trovati.append(((r_max - r_min) - (massimo - minimo), r_min, validi))
+        trovati.sort(key=lambda t: (t[0], t[1]))
+        return [strumento for _, _, validi in trovati for strumento in validi]
+
+    def __len__(self) -> int:
+        return len(self.strumenti)
+
+    def __iter__(self) -> Iterator[CalibrationStandard]:
+        return iter(self.strumenti)
@@ -14,6 +14,14 @@ from . import config
 
 logger = logging.getLogger(__name__)
 
+def _aggiungi_alternative(doc, item: Dict):
+    """Elenca sotto l'utilizzo le alternative suggerite dal registro, se presenti."""
+    alternative = item.get('alternative_suggerite')
+    if not alternative: return
+    doc.add_paragraph("  • Alternative suggerite dal registro:", style='ListBullet')
+    for alternativa in alternative:
+        doc.add_paragraph(f"      – {alternativa}", style='ListBullet')
+
 def crea_e_apri_report_anomalie_word(
     errors_list: List[Dict],
     temporal_list: List[Dict],
@@ -81,6 +89,7 @@ def crea_e_apri_report_anomalie_word(
             p_cert_detail_em = doc.add_paragraph(f"  • Data Emissione Certificato Campione: {item.get('data_emissione_presunta','N/A')}", style='ListBullet')
             run_em_note = p_cert_detail_em.add_run(" - USATO PRIMA DELL'EMISSIONE!")
             run_em_note.bold = True; run_em_note.font.color.rgb = RGBColor(0xFF, 0x00, 0x00)
+            _aggiungi_alternative(doc, item)
             doc.add_paragraph()
         doc.add_paragraph()
 
@@ -100,6 +109,7 @@ def crea_e_apri_report_anomalie_word(
             run_scad_note = p_cert_detail_scad.add_run(" - SCADUTO ALL'USO!")
             run_scad_note.bold = True; run_scad_note.font.color.rgb = RGBColor(0xFF, 0x8C, 0x00)
             doc.add_paragraph(f"  • Note Congruità (se presenti): {item['congruency_notes']}", style='ListBullet')
+            _aggiungi_alternative(doc, item)
             doc.add_paragraph()
         doc.add_paragraph()
 
@@ -114,6 +124,7 @@ def crea_e_apri_report_anomalie_word(
             p_reason = doc.add_paragraph(f"  • Motivo Non Congruità: ", style='ListBullet')
             run_reason = p_reason.add_run(item.get('congruency_notes','Non specificato'))
             run_reason.bold = True; run_reason.font.color.rgb = RGBColor(0x80, 0x00, 0x80)
+            _aggiungi_alternative(doc, item)
             doc.add_paragraph()
         doc.add_paragraph()
 
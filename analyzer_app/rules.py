@@ -0,0 +1,143 @@
+# analyzer_app/rules.py
+"""Regole di validazione del foglio RegoleValidazione compilate in predicati, indicizzate per tipologia e modello L9."""
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .analysis import is_cell_value_empty
+from .normalization import normalize_um, normalize_range_string
+from .profiling import ProfiloRegole, TIPO_CONTROLLO, TIPO_REGOLA
+
+# Campi che le regole leggono in forma normalizzata invece che dai dati grezzi.
+CAMPI_NORMALIZZATI = ('um_ing', 'um_usc', 'um_dcs', 'range_ing', 'range_usc', 'range_dcs', 'modello_l9', 'range_um_processo')
+
+
+def valori_normalizzati(raw_data: Dict, modello_l9_scheda: str) -> Dict:
+    return {
+        'um_ing': normalize_um(raw_data.get('um_ing')), 'um_usc': normalize_um(raw_data.get('um_usc')), 'um_dcs': normalize_um(raw_data.get('um_dcs')),
+        'range_ing': normalize_range_string(raw_data.get('range_ing')), 'range_usc': normalize_range_string(raw_data.get('range_usc')), 'range_dcs': normalize_range_string(raw_data.get('range_dcs')),
+        'modello_l9': modello_l9_scheda, 'range_um_processo': raw_data.get('range_um_processo', "")
+    }
+
+
+def _split_valori(valore_b) -> set:
+    return {v.strip() for v in valore_b.split(',')}
+
+
+class CompiledRule:
+    """Una regola compilata: `verifica(raw_data, normalizzati)` è True se la regola segnala l'errore."""
+
+    __slots__ = ("indice", "tipologia", "modello_l9", "chiave_errore", "usa_normalizzati", "verifica")
+
+    def __init__(self, indice: int, rule: dict):
+        self.indice = indice
+        self.tipologia = rule['TipologiaStrumento']
+        self.modello_l9 = rule['ModelloL9']
+        self.chiave_errore = rule['ChiaveErrore']
+        campo_a, campo_b, op = rule['CampoA'], rule['CampoB_o_Costante'], rule['Operatore']
+        self.usa_normalizzati = campo_a in CAMPI_NORMALIZZATI or campo_b in CAMPI_NORMALIZZATI
+
+        if campo_a in CAMPI_NORMALIZZATI:
+            valore_a = lambda raw, norm: norm[campo_a]
+        else:
+            chiave_a = campo_a.lower()
+            valore_a = lambda raw, norm: raw.get(chiave_a)
+
+        # CampoB è un campo della scheda se presente nei dati grezzi (dipende dal layout), altrimenti
+        # un campo normalizzato o una costante: l'elenco di una costante viene diviso una volta sola.
+        if campo_b in CAMPI_NORMALIZZATI:
+            valore_b = lambda raw, norm: raw[campo_b] if campo_b in raw else norm[campo_b]
+            elenco_b = lambda raw, norm: _split_valori(valore_b(raw, norm))
+        else:
+            valore_b = lambda raw, norm: raw[campo_b] if campo_b in raw else campo_b
+            elenco_costante = _split_valori(campo_b)
+            elenco_b = lambda raw, norm: _split_valori(raw[campo_b]) if campo_b in raw else elenco_costante
+
+        self.verifica = self._predicato(op, valore_a, valore_b, elenco_b)
+
+    @staticmethod
+    def _predicato(op: str, valore_a: Callable, valore_b: Callable, elenco_b: Callable) -> Optional[Callable]:
+        if op == 'is_empty':
+            return lambda raw, norm: is_cell_value_empty(valore_a(raw, norm))
+        if op == 'is_not_empty':
+            return lambda raw, norm: not is_cell_value_empty(valore_a(raw, norm))
+
+        def non_vuoto(confronto):
+            def verifica(raw, norm):
+                a = valore_a(raw, norm)
+                return not is_cell_value_empty(a) and confronto(str(a), raw, norm)
+            return verifica
+
+        if op == '==':
+            return non_vuoto(lambda a, raw, norm: a == str(valore_b(raw, norm)))
+        if op == '!=':
+            return non_vuoto(lambda a, raw, norm: a != str(valore_b(raw, norm)))
+        if op == 'in':
+            return non_vuoto(lambda a, raw, norm: a in elenco_b(raw, norm))
+        if op == 'not_in':
+            return non_vuoto(lambda a, raw, norm: a not in elenco_b(raw, norm))
+        return None  # operatore sconosciuto: la regola non segnala mai
+
+
+class RuleEngine:
+    """
+    Regole di validazione compilate una volta al caricamento della configurazione. Per ogni
+    (tipologia, modello L9) vengono valutate solo le regole applicabili, nell'ordine del foglio.
+    """
+
+    def __init__(self, rules: List[dict]):
+        self.rules = rules
+        self._per_chiave: Dict[Tuple[str, str], List[CompiledRule]] = defaultdict(list)
+        for indice, rule in enumerate(rules):
+            compilata = CompiledRule(indice, rule)
+            if compilata.verifica is not None:
+                self._per_chiave[(compilata.tipologia, compilata.modello_l9)].append(compilata)
+        self._per_chiave = dict(self._per_chiave)
+        self._applicabili: Dict[Tuple[str, str], List[CompiledRule]] = {}
+
+    def applicabili(self, tipologia: str, modello_l9: str) -> List[CompiledRule]:
+        """Regole che si applicano a una scheda con questa tipologia e questo modello L9 ('*' = qualsiasi)."""
+        chiave = (tipologia, modello_l9)
+        regole = self._applicabili.get(chiave)
+        if regole is None:
+            regole = sorted(
+                (r for k in dict.fromkeys([(tipologia, modello_l9), (tipologia, '*'), ('*', modello_l9), ('*', '*')])
+                 for r in self._per_chiave.get(k, ())),
+                key=lambda r: r.indice)
+            self._applicabili[chiave] = regole
+        return regole
+
+    def valuta(self, raw_data: Dict, tipologia: str, modello_l9: str, profilo: Optional[ProfiloRegole] = None) -> List[str]:
+        """
+        Chiavi di errore segnalate dalle regole applicabili, senza ripetizioni e nell'ordine delle regole.
+        Con `profilo` ogni regola viene registrata con la sua ChiaveErrore.
+        """
+        regole = self.applicabili(tipologia, modello_l9)
+        if not regole:
+            return []
+        if profilo is not None:
+            return self._valuta_profilata(regole, raw_data, modello_l9, profilo)
+        normalizzati = valori_normalizzati(raw_data, modello_l9) if any(r.usa_normalizzati for r in regole) else {}
+        chiavi = []
+        for regola in regole:
+            if regola.verifica(raw_data, normalizzati) and regola.chiave_errore not in chiavi:
+                chiavi.append(regola.chiave_errore)
+        return chiavi
+
+    def _valuta_profilata(self, regole: List[CompiledRule], raw_data: Dict, modello_l9: str, profilo: ProfiloRegole) -> List[str]:
+        normalizzati = {}
+        if any(r.usa_normalizzati for r in regole):
+            inizio = time.perf_counter()
+            normalizzati = valori_normalizzati(raw_data, modello_l9)
+            profilo.registra(TIPO_CONTROLLO, "normalizzazione per regole", False, time.perf_counter() - inizio)
+        chiavi = []
+        for regola in regole:
+            inizio = time.perf_counter()
+            hit = regola.verifica(raw_data, normalizzati)
+            profilo.registra(TIPO_REGOLA, regola.chiave_errore, hit, time.perf_counter() - inizio)
+            if hit and regola.chiave_errore not in chiavi:
+                chiavi.append(regola.chiave_errore)
+        return chiavi
+
+    def __len__(self) -> int:
+        return sum(len(regole) for regole in self._per_chiave.values())
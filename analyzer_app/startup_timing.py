@@ -0,0 +1,131 @@
+# analyzer_app/startup_timing.py
+"""Misura dei tempi di avvio: importazioni dei moduli (come `python -X importtime`) e fasi dell'applicazione."""
+import sys
+import time
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Moduli pesanti che devono essere caricati solo dalla funzionalità che li usa, non all'avvio.
+MODULI_DIFFERITI = ("pandas", "xlrd", "docx", "pyperclip")
+
+
+class _TimedLoader:
+    """Avvolge il loader di un modulo per misurarne il tempo di esecuzione; ripristina il loader originale dopo il caricamento."""
+
+    def __init__(self, loader, timer: "ImportTimer"):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        create = getattr(self._loader, "create_module", None)
+        if create is None:
+            return None
+        start = time.perf_counter()
+        try:
+            return create(spec)
+        finally:
+            # I moduli di estensione (C) fanno il lavoro qui, non in exec_module.
+            self._timer._create_time[spec.name] = time.perf_counter() - start
+
+    def exec_module(self, module):
+        name = module.__spec__.name
+        self._timer._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start + self._timer._create_time.pop(name, 0.0)
+            children = self._timer._stack.pop()
+            self._timer.records[name] = (cumulative - children, cumulative)
+            if self._timer._stack:
+                self._timer._stack[-1] += cumulative
+            module.__spec__.loader = self._loader
+            module.__loader__ = self._loader
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class _TimingFinder:
+    """Meta path finder che delega agli altri finder e sostituisce il loader con _TimedLoader."""
+
+    def __init__(self, timer: "ImportTimer"):
+        self._timer = timer
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self._timer)
+        return spec
+
+
+class ImportTimer:
+    """
+    Registra, per ogni modulo importato mentre è attivo, il tempo proprio e quello cumulativo
+    (moduli importati al suo interno compresi), come le colonne self/cumulative di -X importtime.
+    """
+
+    def __init__(self):
+        self.records: Dict[str, Tuple[float, float]] = {}
+        self._stack: List[float] = []
+        self._create_time: Dict[str, float] = {}
+        self._finder = _TimingFinder(self)
+
+    def start(self):
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+        return self
+
+    def stop(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def report(self, top: int = 15) -> str:
+        """Tabella dei moduli più lenti per tempo cumulativo, in millisecondi."""
+        righe = sorted(self.records.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        lines = [f"{'cumul. ms':>10} | {'self ms':>8} | modulo"]
+        lines += [f"{cumulative * 1000:10.1f} | {self_time * 1000:8.1f} | {name}" for name, (self_time, cumulative) in righe]
+        return "\n".join(lines)
+
+
+class StartupReport:
+    """Tempi delle fasi di avvio e riepilogo finale nel log."""
+
+    def __init__(self, import_timer: ImportTimer):
+        self.import_timer = import_timer
+        self._start = time.perf_counter()
+        self._last = self._start
+        self.phases: List[Tuple[str, float]] = []
+
+    def phase(self, name: str):
+        """Chiude la fase corrente con il nome indicato."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def log(self):
+        total = time.perf_counter() - self._start
+        fasi = ", ".join(f"{name} {elapsed * 1000:.0f} ms" for name, elapsed in self.phases)
+        logger.info(f"Tempo di avvio: {total * 1000:.0f} ms ({fasi}).")
+        logger.info(f"Importazioni più lente all'avvio:\n{self.import_timer.report()}")
+        caricati = [name for name in MODULI_DIFFERITI if name in sys.modules]
+        if caricati:
+            logger.warning(f"Moduli pesanti caricati durante l'avvio (dovrebbero essere differiti): {', '.join(caricati)}")
@@ -0,0 +1,161 @@
+# analyzer_app/workers.py
+import os
+import time
+import pickle
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Intervallo massimo di attesa dei risultati prima di ricontrollare i timeout.
+_POLL_INTERVAL_SEC = 0.5
+
+
+def _picklable_error(exc: BaseException) -> BaseException:
+    """Restituisce l'eccezione stessa se serializzabile, altrimenti un RuntimeError equivalente."""
+    try:
+        pickle.dumps(exc)
+        return exc
+    except Exception:
+        return RuntimeError(f"{type(exc).__name__}: {exc}")
+
+
+def _worker_loop(conn, task_fn: Callable, initializer: Optional[Callable], initargs: tuple):
+    """Ciclo di un processo del pool: esegue task_fn su ogni elemento ricevuto finché non riceve None."""
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, item = task
+        try:
+            conn.send((task_id, 'success', task_fn(item)))
+        except Exception as e:
+            conn.send((task_id, 'error', _picklable_error(e)))
+
+
+class _WorkerHandle:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.task_id: Optional[int] = None
+        self.deadline: Optional[float] = None
+
+
+class SheetWorkerPool:
+    """
+    Pool di processi persistenti per l'elaborazione delle schede.
+
+    I processi vengono avviati una sola volta e riutilizzati per tutti i file, così
+    le importazioni pesanti (pandas, openpyxl, xlrd) avvengono una volta per processo
+    e non per file. Ogni file ha un timeout: se un processo lo supera viene terminato
+    e sostituito, mentre gli altri continuano a lavorare.
+    """
+
+    def __init__(self, task_fn: Callable, processes: Optional[int] = None, timeout: float = 30,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.task_fn = task_fn
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self._workers: List[_WorkerHandle] = []
+        for _ in range(self.processes):
+            self._workers.append(self._start_worker())
+
+    def _start_worker(self) -> _WorkerHandle:
+        # Ogni processo ha la propria pipe: terminare un processo bloccato non può
+        # corrompere il canale degli altri.
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_worker_loop,
+            args=(child_conn, self.task_fn, self.initializer, self.initargs),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _WorkerHandle(process, parent_conn)
+
+    def _replace_worker(self, handle: _WorkerHandle):
+        if handle.process.is_alive():
+            handle.process.terminate()
+        handle.process.join()
+        handle.conn.close()
+        self._workers[self._workers.index(handle)] = self._start_worker()
+
+    def imap_unordered(self, items: Iterable) -> Iterator[Tuple[object, str, object]]:
+        """
+        Elabora gli elementi in parallelo e restituisce (elemento, stato, risultato) man mano
+        che terminano. Lo stato è 'success' oppure 'error'; in caso di errore il risultato è
+        l'eccezione (TimeoutError se il file ha superato il timeout).
+        """
+        pending = list(enumerate(items))
+        pending.reverse()
+        in_flight: Dict[int, object] = {}
+
+        while pending or in_flight:
+            for handle in self._workers:
+                if not pending:
+                    break
+                if handle.task_id is None:
+                    task_id, item = pending.pop()
+                    in_flight[task_id] = item
+                    handle.task_id = task_id
+                    handle.deadline = time.monotonic() + self.timeout
+                    try:
+                        handle.conn.send((task_id, item))
+                    except OSError:
+                        pass  # processo già terminato: rilevato dal controllo sotto
+
+            busy = {h.conn: h for h in self._workers if h.task_id is not None}
+            for conn in wait(list(busy), timeout=_POLL_INTERVAL_SEC):
+                handle = busy[conn]
+                try:
+                    task_id, status, result = conn.recv()
+                except (EOFError, OSError):
+                    continue  # processo terminato: gestito sotto
+                handle.task_id = handle.deadline = None
+                yield in_flight.pop(task_id), status, result
+
+            now = time.monotonic()
+            for handle in list(self._workers):
+                if handle.task_id is None:
+                    continue
+                if handle.deadline <= now:
+                    error = TimeoutError(f"L'elaborazione del file ha superato i {self.timeout:g} secondi.")
+                elif not handle.process.is_alive():
+                    error = RuntimeError(f"Il processo di elaborazione è terminato inaspettatamente (exit code {handle.process.exitcode}).")
+                else:
+                    continue
+                item = in_flight.pop(handle.task_id)
+                logger.warning(f"Processo {handle.process.pid} sostituito: {error}")
+                self._replace_worker(handle)
+                yield item, 'error', error
+
+    def close(self):
+        """Chiude i processi del pool; quelli ancora occupati vengono terminati."""
+        for handle in self._workers:
+            if handle.task_id is None and handle.process.is_alive():
+                try:
+                    handle.conn.send(None)
+                except (OSError, BrokenPipeError):
+                    pass
+        for handle in self._workers:
+            handle.process.join(timeout=1)
+            if handle.process.is_alive():
+                handle.process.terminate()
+                handle.process.join()
+            handle.conn.close()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,353 @@
+# analyzer_app/xlsx_reader.py
+import posixpath
+import re
+from bisect import bisect_left, bisect_right
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import coordinate_to_tuple, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+logger = logging.getLogger(__name__)
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+TAG_ROW = NS_MAIN + "row"
+TAG_CELL = NS_MAIN + "c"
+TAG_VALUE = NS_MAIN + "v"
+TAG_FORMULA = NS_MAIN + "f"
+TAG_INLINE_STR = NS_MAIN + "is"
+TAG_TEXT = NS_MAIN + "t"
+TAG_RICH_RUN = NS_MAIN + "r"
+TAG_MERGE_CELL = NS_MAIN + "mergeCell"
+
+_CHUNK_SIZE = 64 * 1024
+_SCAN_OVERLAP = 256
+_MERGE_CELL_RE = re.compile(rb'<(?:\w+:)?mergeCell\s+ref="([A-Za-z0-9:$]+)"')
+_MERGE_CELLS_END_RE = re.compile(rb'</(?:\w+:)?mergeCells>')
+
+REL_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+
+def _string_item_text(element) -> str:
+    """Concatena il testo di un elemento <si>/<is> (testo semplice o rich text), come openpyxl."""
+    parts = []
+    for child in element:
+        if child.tag == TAG_TEXT:
+            parts.append(child.text or "")
+        elif child.tag == TAG_RICH_RUN:
+            t = child.find(TAG_TEXT)
+            if t is not None:
+                parts.append(t.text or "")
+    return "".join(parts)
+
+
+def _merge_ref_to_bounds(ref: str) -> Tuple[int, int, int, int]:
+    """Converte un riferimento "A1:C3" in (riga_min, col_min, riga_max, col_max), 1-based."""
+    min_col, min_row, max_col, max_row = range_boundaries(ref.replace("$", ""))
+    return min_row, min_col, max_row, max_col
+
+
+def index_merged_cells(
+    merged_ranges: Iterable[Tuple[int, int, int, int]],
+    cells: Iterable[Tuple[int, int]],
+) -> Dict[Tuple[int, int], Tuple[int, int, int, int]]:
+    """
+    Indicizza le celle unite limitandosi alle celle richieste.
+
+    `merged_ranges` contiene tuple (riga_min, col_min, riga_max, col_max) con estremi
+    inclusi; restituisce {(riga, col): intervallo} per le sole celle di `cells` coperte
+    da un intervallo. Il costo è una ricerca binaria sulle righe richieste per ogni
+    intervallo, poi ogni lookup è un accesso a dizionario.
+    """
+    cols_by_row: Dict[int, List[int]] = {}
+    for r, c in cells:
+        cols_by_row.setdefault(r, []).append(c)
+    rows = sorted(cols_by_row)
+    index = {}
+    for bounds in merged_ranges:
+        min_row, min_col, max_row, max_col = bounds
+        for i in range(bisect_left(rows, min_row), bisect_right(rows, max_row)):
+            r = rows[i]
+            for c in cols_by_row[r]:
+                if min_col <= c <= max_col:
+                    index.setdefault((r, c), bounds)
+    return index
+
+
+def _cast_number(value: str):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxSheetReader:
+    """
+    Legge il foglio attivo di un file .xlsx aprendo il pacchetto una sola volta.
+
+    Una singola scansione dell'XML del foglio fornisce sia il valore in cache
+    (equivalente a openpyxl con data_only=True) sia il testo della formula
+    (equivalente a data_only=False). Stringhe condivise e formati data vengono
+    risolti solo per le coordinate effettivamente richieste.
+
+    Se `cells` indica le celle (riga, colonna) 1-based di interesse, vengono
+    conservate solo le righe fino all'ultima necessaria e il parsing si ferma lì.
+    """
+
+    def __init__(self, file_path: str, cells: Optional[Iterable[Tuple[int, int]]] = None):
+        self.file_path = file_path
+        self._requested_cells = set(cells) if cells is not None else None
+        self._max_row: Optional[int] = max(r for r, _ in self._requested_cells) if self._requested_cells else None
+        self._archive = zipfile.ZipFile(file_path)
+        self._shared_strings: List[str] = []
+        self._shared_strings_iter = None
+        self.epoch = CALENDAR_WINDOWS_1900
+        self._date_styles: set = set()
+        self._timedelta_styles: set = set()
+        # coordinata -> (tipo, stile, valore grezzo, testo formula, tipo formula, indice formula condivisa)
+        self._cells: Dict[Tuple[int, int], tuple] = {}
+        self._shared_formulae: Dict[str, Translator] = {}
+        self._merged_ranges: List[Tuple[int, int, int, int]] = []
+        self._merged_index: Optional[Dict[Tuple[int, int], Tuple[int, int, int, int]]] = None
+
+        self._workbook_part, sheet_part = self._locate_active_sheet()
+        self._shared_strings_part = self._find_workbook_part("sharedStrings")
+        self._load_styles()
+        self._parse_sheet(sheet_part)
+
+    def close(self):
+        if self._shared_strings_iter is not None:
+            self._shared_strings_iter.close()
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Struttura del pacchetto ---
+
+    def _read_rels(self, part_name: str) -> Dict[str, Tuple[str, str]]:
+        """Restituisce {rId: (tipo, percorso assoluto nel pacchetto)} per le relazioni di una parte."""
+        folder, filename = posixpath.split(part_name)
+        rels_path = posixpath.join(folder, "_rels", filename + ".rels")
+        try:
+            root = ET.fromstring(self._archive.read(rels_path))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root.iter(NS_PKG_REL + "Relationship"):
+            target = rel.get("Target", "")
+            if target.startswith("/"):
+                path = target.lstrip("/")
+            else:
+                path = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get("Id")] = (rel.get("Type", ""), path)
+        return rels
+
+    def _locate_active_sheet(self) -> Tuple[str, str]:
+        workbook_part = "xl/workbook.xml"
+        for rel_type, path in self._read_rels("").values():
+            if rel_type == REL_OFFICE_DOCUMENT:
+                workbook_part = path
+                break
+        self._workbook_rels = self._read_rels(workbook_part)
+
+        root = ET.fromstring(self._archive.read(workbook_part))
+        workbook_pr = root.find(NS_MAIN + "workbookPr")
+        if workbook_pr is not None and workbook_pr.get("date1904", "").lower() in ("1", "true"):
+            self.epoch = CALENDAR_MAC_1904
+
+        active_idx = 0
+        book_views = root.find(NS_MAIN + "bookViews")
+        if book_views is not None:
+            for view in book_views:
+                if view.get("activeTab") is not None:
+                    active_idx = int(view.get("activeTab"))
+                    break
+
+        sheets = [s for s in root.iter(NS_MAIN + "sheet") if s.get(NS_DOC_REL + "id")]
+        if not sheets:
+            raise ValueError(f"Nessun foglio trovato in {self.file_path}")
+        sheet = sheets[active_idx] if active_idx < len(sheets) else sheets[0]
+        return workbook_part, self._workbook_rels[sheet.get(NS_DOC_REL + "id")][1]
+
+    def _find_workbook_part(self, rel_suffix: str) -> Optional[str]:
+        for rel_type, path in self._workbook_rels.values():
+            if rel_type.endswith("/" + rel_suffix):
+                return path
+        return None
+
+    def _load_styles(self):
+        styles_part = self._find_workbook_part("styles")
+        if not styles_part:
+            return
+        root = ET.fromstring(self._archive.read(styles_part))
+        custom_formats = {}
+        num_fmts = root.find(NS_MAIN + "numFmts")
+        if num_fmts is not None:
+            for fmt in num_fmts:
+                custom_formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode", "")
+        cell_xfs = root.find(NS_MAIN + "cellXfs")
+        if cell_xfs is None:
+            return
+        for idx, xf in enumerate(cell_xfs):
+            fmt_id = int(xf.get("numFmtId", 0))
+            fmt = custom_formats.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+            if fmt is None:
+                continue
+            if is_date_format(fmt):
+                self._date_styles.add(idx)
+            if is_timedelta_format(fmt):
+                self._timedelta_styles.add(idx)
+
+    def _iter_shared_strings(self):
+        if not self._shared_strings_part:
+            return
+        with self._archive.open(self._shared_strings_part) as src:
+            for _, element in ET.iterparse(src):
+                if element.tag == NS_MAIN + "si":
+                    yield _string_item_text(element)
+                    element.clear()
+
+    def _shared_string(self, idx: int) -> str:
+        """Restituisce la stringa condivisa `idx`, leggendo sharedStrings.xml solo fino all'indice richiesto."""
+        if self._shared_strings_iter is None:
+            self._shared_strings_iter = self._iter_shared_strings()
+        while len(self._shared_strings) <= idx:
+            try:
+                self._shared_strings.append(next(self._shared_strings_iter))
+            except StopIteration:
+                raise IndexError(f"Stringa condivisa {idx} non presente in {self.file_path}")
+        return self._shared_strings[idx]
+
+    # --- Lettura del foglio ---
+
+    def _parse_sheet(self, sheet_part: str):
+        """
+        Scorre l'XML del foglio in streaming. Se è noto l'ultimo rigo necessario,
+        il parsing XML si interrompe appena superato: le righe successive vengono
+        solo decompresse e scandite a livello di byte alla ricerca di <mergeCell>,
+        che nel formato OOXML segue sempre <sheetData>.
+        """
+        parser = ET.XMLPullParser(events=("end",))
+        row_counter = 0
+        col_counter = 0
+        merged = set()
+        with self._archive.open(sheet_part) as src:
+            chunk = src.read(_CHUNK_SIZE)
+            while chunk:
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    tag = element.tag
+                    if tag == TAG_ROW:
+                        row_counter = int(element.get("r", row_counter + 1))
+                        if self._max_row is not None and row_counter > self._max_row:
+                            # Ultimo rigo utile superato: i mergeCell vanno cercati dal blocco corrente in poi
+                            self._scan_merge_cells(src, chunk, merged)
+                            self._merged_ranges = sorted(merged)
+                            return
+                        col_counter = 0
+                        for cell in element.iter(TAG_CELL):
+                            coordinate = cell.get("r")
+                            if coordinate:
+                                r, c = coordinate_to_tuple(coordinate)
+                            else:
+                                r, c = row_counter, col_counter + 1
+                            col_counter = c
+                            self._store_cell(r, c, cell)
+                        element.clear()
+                    elif tag == TAG_MERGE_CELL:
+                        merged.add(_merge_ref_to_bounds(element.get("ref")))
+                chunk = src.read(_CHUNK_SIZE)
+            parser.close()
+        self._merged_ranges = sorted(merged)
+
+    @staticmethod
+    def _scan_merge_cells(src, current_chunk: bytes, merged: set):
+        """Cerca i riferimenti <mergeCell ref="..."/> nei byte rimanenti del foglio senza costruire l'albero XML."""
+        tail = b""
+        chunk = current_chunk
+        while chunk:
+            data = tail + chunk
+            for match in _MERGE_CELL_RE.finditer(data):
+                merged.add(_merge_ref_to_bounds(match.group(1).decode("ascii")))
+            if _MERGE_CELLS_END_RE.search(data):
+                return
+            tail = data[-_SCAN_OVERLAP:]
+            chunk = src.read(_CHUNK_SIZE)
+
+    def _store_cell(self, r: int, c: int, cell):
+        data_type = cell.get("t", "n")
+        style_id = int(cell.get("s", 0) or 0)
+        if data_type == "inlineStr":
+            inline = cell.find(TAG_INLINE_STR)
+            raw_value = _string_item_text(inline) if inline is not None else None
+        else:
+            raw_value = cell.findtext(TAG_VALUE) or None
+        formula_text = formula_type = formula_si = None
+        formula = cell.find(TAG_FORMULA)
+        if formula is not None:
+            formula_type = formula.get("t")
+            formula_si = formula.get("si")
+            formula_text = "=" + (formula.text or "")
+            if formula_type == "shared" and formula_text != "=" and formula_si not in self._shared_formulae:
+                self._shared_formulae[formula_si] = Translator(formula_text, f"{get_column_letter(c)}{r}")
+        self._cells[(r, c)] = (data_type, style_id, raw_value, formula_text, formula_type, formula_si)
+
+    def _cached_value(self, r: int, c: int):
+        entry = self._cells.get((r, c))
+        if entry is None:
+            return None
+        data_type, style_id, raw_value, *_ = entry
+        if raw_value is None:
+            return None
+        if data_type == "n":
+            value = _cast_number(raw_value)
+            if style_id in self._date_styles:
+                try:
+                    value = from_excel(value, self.epoch, timedelta=style_id in self._timedelta_styles)
+                except (OverflowError, ValueError):
+                    value = "#VALUE!"
+            return value
+        if data_type == "s":
+            return self._shared_string(int(raw_value))
+        if data_type == "b":
+            return bool(int(raw_value))
+        if data_type == "d":
+            return from_ISO8601(raw_value)
+        return raw_value
+
+    def formula(self, r: int, c: int) -> Optional[str]:
+        """Testo della formula della cella (con '=' iniziale) o None se la cella non contiene una formula."""
+        entry = self._cells.get((r, c))
+        if entry is None or entry[3] is None:
+            return None
+        _, _, _, formula_text, formula_type, formula_si = entry
+        if formula_type in ("array", "dataTable"):
+            # openpyxl restituisce un oggetto ArrayFormula/DataTableFormula, non una stringa '=...'
+            return None
+        if formula_type == "shared" and formula_text == "=" and formula_si in self._shared_formulae:
+            return self._shared_formulae[formula_si].translate_formula(f"{get_column_letter(c)}{r}")
+        return formula_text
+
+    def value(self, r: int, c: int):
+        """Valore in cache della cella; per celle unite restituisce il valore della cella in alto a sinistra."""
+        if self._merged_index is None:
+            cells = self._requested_cells if self._requested_cells is not None else self._cells.keys()
+            self._merged_index = index_merged_cells(self._merged_ranges, cells)
+        if self._requested_cells is None or (r, c) in self._requested_cells:
+            bounds = self._merged_index.get((r, c))
+        else:
+            # Cella fuori dall'insieme richiesto: ricerca puntuale sugli intervalli
+            bounds = next((b for b in self._merged_ranges if b[0] <= r <= b[2] and b[1] <= c <= b[3]), None)
+        if bounds is not None:
+            return self._cached_value(bounds[0], bounds[1])
+        return self._cached_value(r, c)
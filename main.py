@@ -1,5 +1,4 @@
-import tkinter as tk
-from tkinter import messagebox
+import argparse
 import logging
 import sys
 import os
@@ -50,8 +49,52 @@ def setup_logging(log_path=None):
     else:
         logging.warning("Percorso del file di log non fornito. Il log andrà solo su console.")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analisi delle schede di taratura.")
+    parser.add_argument("--batch", action="store_true", help="Analizza la cartella senza interfaccia grafica e scrive i risultati su file.")
+    parser.add_argument("--output", help="File dei risultati in modalità batch (default: cartella dei log).")
+    parser.add_argument("--formato", choices=("jsonl", "csv"), default="jsonl", help="Formato dei risultati in modalità batch.")
+    parser.add_argument("--cartella", help="Cartella delle schede (default: cella B3 del file parametri).")
+    parser.add_argument("--simula-regole", metavar="RISULTATI", help="Confronta un file di risultati batch con le regole attuali, usando i dati in cache, ed esce (--output: CSV delle variazioni).")
+    parser.add_argument("--profila-regole", action="store_true", help="Misura valutazioni, segnalazioni e tempo di ogni controllo e regola (tabella nel log e CSV).")
+    parser.add_argument("--dump-congruita", metavar="FILE", help="Scrive in CSV la tabella di congruità dei campioni ed esce.")
+    return parser.parse_args(argv)
+
+def main_batch(args):
+    """Analisi senza interfaccia grafica; non importa tkinter, pyperclip né python-docx. Restituisce il codice di uscita."""
+    setup_logging()
+    try:
+        from analyzer_app import config, batch
+        config.load_config()
+        setup_logging(log_path=config.LOG_FILEPATH)
+        if args.profila_regole: config.PROFILA_REGOLE = True
+        if args.simula_regole:
+            return batch.run_simulazione_regole(args.simula_regole, output_path=args.output)
+        return batch.run_batch(output_path=args.output, formato=args.formato, folder_path=args.cartella)
+    except Exception as e:
+        logging.critical(f"Errore critico durante l'analisi batch: {type(e).__name__}: {e}", exc_info=True)
+        return 2  # batch.EXIT_ERRORE (il modulo potrebbe non essere importabile)
+    finally:
+        logging.shutdown()
+
 def main():
     """Punto di ingresso principale dell'applicazione."""
+    args = parse_args()
+    if args.dump_congruita:
+        from analyzer_app import analysis
+        print(f"Tabella di congruità: {analysis.dump_tabella_congruita(args.dump_congruita)} righe scritte in {args.dump_congruita}")
+        sys.exit(0)
+    if args.batch or args.simula_regole:
+        sys.exit(main_batch(args))
+
+    # Tempi di avvio: le importazioni vengono misurate fino alla comparsa della finestra.
+    from analyzer_app.startup_timing import ImportTimer, StartupReport
+    import_timer = ImportTimer().start()
+    startup_report = StartupReport(import_timer)
+
+    import tkinter as tk
+    from tkinter import messagebox
+
     # Set up basic console logging immediately to catch early errors
     setup_logging()
 
@@ -63,10 +106,13 @@ def main():
         from analyzer_app.gui import App
 
         logging.info("Importazioni dei moduli dell'applicazione riuscite.")
+        startup_report.phase("importazioni")
 
         # Now, load the configuration, which might fail if the file is missing/corrupt
         config.load_config()
+        if args.profila_regole: config.PROFILA_REGOLE = True
         logging.info("Configurazione caricata da 'parametri.xlsm'.")
+        startup_report.phase("configurazione")
 
         # Re-configure logging to include the file path from the now-loaded config
         setup_logging(log_path=config.LOG_FILEPATH)
@@ -74,6 +120,9 @@ def main():
         logging.info("Avvio dell'interfaccia grafica (GUI)...")
         root = tk.Tk()
         app = App(root)
+        import_timer.stop()
+        startup_report.phase("interfaccia")
+        root.after_idle(startup_report.log)
         root.mainloop()
 
     except Exception as e:
@@ -104,6 +153,7 @@ def main():
             print("Impossibile mostrare la finestra di dialogo di errore. Controllare i log.")
 
     finally:
+        import_timer.stop()
         logging.info("Applicazione terminata.")
         logging.shutdown()
 